@@ -7,17 +7,30 @@ Features:
 - Executes daily buys within configurable window (default 10:00–10:10 EST)
 - TP/SL logic varies by day held, also set on day 1
 - Buy max fixed at $5,000 per symbol
-- All IBKR calls run in main thread to avoid asyncio issues
+- APScheduler only queues the jobs; they (and every IBKR call) run in the main thread,
+  which owns the connection's event loop and pumps it between jobs
 - Reads POTD from Google Sheet
 """
 
-from ib_insync import IB, Stock, LimitOrder, ExecutionFilter
+from ib_insync import IB, Stock, LimitOrder, StopOrder, ExecutionFilter
 from datetime import datetime, timedelta
+import numpy as np
 import pytz
 import gspread
+from apscheduler.schedulers.background import BackgroundScheduler
 from math import floor
+from pathlib import Path
+import queue
+import sys
 import time
 
+# --- PATH SETUP ---
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
+from utils.utils_ibkr_portfolio import pick_price, request_snapshots, wait_for_prices
+
 # ==========================
 # CONFIGURATION PARAMETERS
 # ==========================
@@ -27,7 +40,9 @@ CLIENT_ID = 1               # Unique client ID
 TARGET_ACCOUNT = 'DUO713598'
 
 MAX_BUY_AMOUNT = 5000       # $5000 per symbol
+TICKER_TIMEOUT = 2          # max seconds to wait for a market data tick
 TIMEZONE = 'US/Eastern'
+TZ = pytz.timezone(TIMEZONE)
 
 # Time windows (EST)
 TP_SL_UPDATE_HOUR = 12
@@ -43,94 +58,143 @@ DAILY_BUY_START_MIN = 49
 DAILY_BUY_END_HOUR = 12
 DAILY_BUY_END_MIN = 50
 
-# TP/SL percentages by holding day
-TP_SL_RULES = {
-    1: {'TP': 0.20, 'SL': -0.15},  # Day 1 = same as day 2
-    2: {'TP': 0.20, 'SL': -0.15},
-    3: {'TP': 0.15, 'SL': -0.10},
-    4: {'TP': 0.10, 'SL': -0.10},
-    5: {'TP': 0.10, 'SL': -0.10},
-}
+# TP/SL multipliers indexed by holding day (1-5); day 1 = same as day 2
+TP_MULT = np.array([0.0, 1.20, 1.20, 1.15, 1.10, 1.10])
+SL_MULT = np.array([0.0, 0.85, 0.85, 0.90, 0.90, 0.90])
 
 # Google Sheet config
 SPREADSHEET_ID = '1gEHjNEI-0Zr-_cMzHsOnEurcA0q2rGtdDgEyRKFgY38'
 SHEET_NAME = 'selected_MDA'
+POTD_CACHE_TTL = 30         # seconds to reuse the last POTD read
+IDLE_PUMP = 1               # seconds the main thread pumps IB events while no job is queued
+
+_WORKSHEET = None
+_POTD_CACHE = {'ts': 0, 'value': None}
+BUY_DATES = {}              # conId -> earliest buy datetime, kept current by execution events
+OPEN_SELLS = {}             # symbol -> [Trade] of live SELL orders, kept current by order events
+JOB_QUEUE = queue.SimpleQueue()  # jobs handed from scheduler threads to the main (IB) thread
 
 # ==========================
 # HELPER FUNCTIONS
 # ==========================
 
+def enqueue_job(job):
+    """Scheduler callback: hand job(ib) to the main thread, which owns the IB connection"""
+    JOB_QUEUE.put(job)
+
 def connect_gsheet():
-    """Connect to Google Sheet and return the worksheet"""
-    gc = gspread.service_account()  # assumes you have credentials json configured
-    sh = gc.open_by_key(SPREADSHEET_ID)
-    ws = sh.worksheet(SHEET_NAME)
-    return ws
-
-def get_potd():
-    """Retrieve POTD symbols from Google Sheet"""
+    """Connect to Google Sheet once and return the (cached) worksheet"""
+    global _WORKSHEET
+    if _WORKSHEET is None:
+        gc = gspread.service_account()  # assumes you have credentials json configured
+        sh = gc.open_by_key(SPREADSHEET_ID)
+        _WORKSHEET = sh.worksheet(SHEET_NAME)
+    return _WORKSHEET
+
+def get_potd(ttl=POTD_CACHE_TTL):
+    """Retrieve POTD symbols from Google Sheet, reusing the last read for ttl seconds"""
+    if _POTD_CACHE['value'] is not None and time.time() - _POTD_CACHE['ts'] < ttl:
+        return _POTD_CACHE['value']
     ws = connect_gsheet()
     data = ws.col_values(1)
     potd = [s.strip().upper() for s in data if s.strip()]
     print(f"POTD today: {potd}")
+    _POTD_CACHE['value'] = potd
+    _POTD_CACHE['ts'] = time.time()
     return potd
 
-def get_positions_with_buy_dates(ib):
+def record_buy_fill(fill):
     """
-    Fetch current positions and map symbol to buy date.
-    Only considers BOT (buy) executions.
+    Fold a single fill into BUY_DATES.
+    Only considers BOT (buy) executions; keeps the earliest buy per conId.
     """
-    ex_filter = ExecutionFilter()
-    executions = ib.reqExecutions(ex_filter)
-    executions = [ex for ex in executions if ex.execution.acctNumber == TARGET_ACCOUNT]
-
-    buy_dates = {}
-    for ex in executions:
-        if ex.execution.side == 'BOT':
-            symbol = ex.contract.symbol if hasattr(ex, 'contract') else ex.execution.symbol
-            buy_date = datetime.strptime(ex.execution.time, "%Y%m%d  %H:%M:%S")
-            # Take the earliest buy date for this symbol
-            if symbol not in buy_dates or buy_date < buy_dates[symbol]:
-                buy_dates[symbol] = buy_date
-    return buy_dates
+    ex = fill.execution
+    if ex.acctNumber != TARGET_ACCOUNT or ex.side != 'BOT':
+        return
+    conId = fill.contract.conId
+    buy_date = ex.time
+    if isinstance(buy_date, str):
+        buy_date = datetime.strptime(buy_date, "%Y%m%d  %H:%M:%S")
+    elif buy_date.tzinfo is not None:
+        buy_date = buy_date.astimezone(TZ).replace(tzinfo=None)
+    if conId not in BUY_DATES or buy_date < BUY_DATES[conId]:
+        BUY_DATES[conId] = buy_date
+
+def on_exec_details(trade, fill):
+    record_buy_fill(fill)
+
+def on_commission_report(trade, fill, report):
+    record_buy_fill(fill)
+
+def seed_buy_dates(ib):
+    """Seed BUY_DATES once from execution history and subscribe to new fills"""
+    ib.execDetailsEvent += on_exec_details
+    ib.commissionReportEvent += on_commission_report
+    for fill in ib.reqExecutions(ExecutionFilter()):
+        record_buy_fill(fill)
+    print(f"Seeded buy dates for {len(BUY_DATES)} contracts")
+
+def track_sell_order(trade):
+    """Record a live SELL trade in OPEN_SELLS"""
+    if trade.order.action.upper() != 'SELL' or trade.isDone():
+        return
+    sells = OPEN_SELLS.setdefault(trade.contract.symbol, [])
+    if not any(t is trade for t in sells):
+        sells.append(trade)
+
+def on_order_status(trade):
+    """Drop completed/cancelled SELL trades from OPEN_SELLS"""
+    if not trade.isDone():
+        return
+    sells = OPEN_SELLS.get(trade.contract.symbol)
+    if sells:
+        sells[:] = [t for t in sells if t is not trade]
+
+def track_open_sells(ib):
+    """Seed OPEN_SELLS from the open trades and subscribe to order events"""
+    ib.openOrderEvent += track_sell_order
+    ib.orderStatusEvent += on_order_status
+    for trade in ib.openTrades():
+        track_sell_order(trade)
 
 def cancel_sell_orders_for_symbol(ib, symbol):
     """Cancel all open sell orders (TP/SL) for a given symbol"""
-    open_orders = ib.openOrders()
     canceled = 0
-    for trade in open_orders:
-        order = trade.order
-        contract = trade.contract
-        if contract.symbol == symbol and order.action.upper() == 'SELL':
-            ib.cancelOrder(order)
-            canceled += 1
+    for trade in OPEN_SELLS.pop(symbol, []):
+        ib.cancelOrder(trade.order)
+        canceled += 1
     if canceled == 0:
         print(f"No SELL orders to cancel for {symbol}")
     else:
         print(f"Canceled {canceled} SELL orders for {symbol}")
 
+def place_tp_sl_orders(ib, contract, tp_price, sl_price):
+    """Place an OCA-linked TP (limit) / SL (stop) pair at the given prices"""
+    # TP/SL share an OCA group so one filling cancels the other
+    oca_group = f"{contract.symbol}_tpsl_{datetime.now():%Y%m%d%H%M%S}"
+
+    # Place TP order
+    tp_order = LimitOrder('SELL', 1, tp_price, ocaGroup=oca_group, ocaType=1)
+    track_sell_order(ib.placeOrder(contract, tp_order))
+    print(f"Placed TP for {contract.symbol} at {tp_price}")
+
+    # Place SL order (stop, so it still triggers if price gaps below it)
+    sl_order = StopOrder('SELL', 1, sl_price, ocaGroup=oca_group, ocaType=1)
+    track_sell_order(ib.placeOrder(contract, sl_order))
+    print(f"Placed SL for {contract.symbol} at {sl_price}")
+
 def place_tp_sl_for_symbol(ib, contract, buy_price, holding_day):
     """Place TP/SL orders based on holding day"""
-    rules = TP_SL_RULES.get(holding_day)
-    if not rules:
+    if not 1 <= holding_day < len(TP_MULT):
         print(f"No TP/SL rules for holding day {holding_day}")
         return
 
-    tp_price = round(buy_price * (1 + rules['TP']), 2)
-    sl_price = round(buy_price * (1 + rules['SL']), 2)
+    tp_price = round(buy_price * TP_MULT[holding_day], 2)
+    sl_price = round(buy_price * SL_MULT[holding_day], 2)
 
     # Cancel existing TP/SL orders
     cancel_sell_orders_for_symbol(ib, contract.symbol)
-
-    # Place TP order
-    tp_order = LimitOrder('SELL', 1, tp_price)
-    ib.placeOrder(contract, tp_order)
-    print(f"Placed TP for {contract.symbol} at {tp_price}")
-
-    # Place SL order
-    sl_order = LimitOrder('SELL', 1, sl_price)
-    ib.placeOrder(contract, sl_order)
-    print(f"Placed SL for {contract.symbol} at {sl_price}")
+    place_tp_sl_orders(ib, contract, tp_price, sl_price)
 
 # ==========================
 # TRADING FUNCTIONS
@@ -140,48 +204,88 @@ def update_tp_sl_daily(ib):
     """Update TP/SL for all current positions"""
     print("=== Updating TP/SL ===")
     positions = ib.positions()
-    buy_dates = get_positions_with_buy_dates(ib)
-    today = datetime.now(pytz.timezone(TIMEZONE)).date()
+    if not positions:
+        print("No open positions.")
+        return
+    today = datetime.now(TZ).date()
 
+    pending = []
     for pos in positions:
         if pos.account != TARGET_ACCOUNT or pos.position <= 0:
             continue
         symbol = pos.contract.symbol
         conId = pos.contract.conId
-        buy_date = buy_dates.get(conId)
+        buy_date = BUY_DATES.get(conId)
         if not buy_date:
             continue
         holding_day = (today - buy_date.date()).days + 1  # include day 1
-        place_tp_sl_for_symbol(ib, pos.contract, pos.avgCost, holding_day)
+        if 1 <= holding_day < len(TP_MULT):
+            pending.append((pos, holding_day))
+
+    if not pending:
+        return
+
+    # Price every position in one vectorised pass
+    buy_prices = np.fromiter((pos.avgCost for pos, _ in pending), float, len(pending))
+    holding_days = np.fromiter((day for _, day in pending), int, len(pending))
+    tp_prices = np.round(buy_prices * TP_MULT[holding_days], 2)
+    sl_prices = np.round(buy_prices * SL_MULT[holding_days], 2)
+
+    # Cancel all existing TP/SL in one pass, then place the new ones in one pass
+    for pos, _ in pending:
+        cancel_sell_orders_for_symbol(ib, pos.contract.symbol)
+    for (pos, _), tp_price, sl_price in zip(pending, tp_prices, sl_prices):
+        place_tp_sl_orders(ib, pos.contract, float(tp_price), float(sl_price))
 
 def execute_forced_sales_window(ib):
     """Sell tickers on their 6th trading day"""
     print("=== Executing Forced Sales ===")
     positions = ib.positions()
-    buy_dates = get_positions_with_buy_dates(ib)
-    today = datetime.now(pytz.timezone(TIMEZONE)).date()
+    if not positions:
+        print("No open positions.")
+        return
+    today = datetime.now(TZ).date()
 
+    due = []
     for pos in positions:
         if pos.account != TARGET_ACCOUNT or pos.position <= 0:
             continue
-        symbol = pos.contract.symbol
-        conId = pos.contract.conId
-        buy_date = buy_dates.get(conId)
+        buy_date = BUY_DATES.get(pos.contract.conId)
         if not buy_date:
             continue
         holding_day = (today - buy_date.date()).days + 1
         if holding_day >= 6:
-            qty = int(pos.position)
-            order = LimitOrder('SELL', qty, pos.marketPrice * 0.99)  # aggressive limit
-            ib.placeOrder(pos.contract, order)
-            print(f"Forced sale: {symbol}, qty={qty}")
+            due.append(pos)
+
+    if not due:
+        return
+
+    # Positions carry no market price, so price every due position from one batch of snapshots
+    tickers = request_snapshots(ib, [pos.contract for pos in due])
+    for pos, ticker in zip(due, tickers):
+        symbol = pos.contract.symbol
+        market_price = pick_price(ticker)
+        if market_price is None:
+            print(f"No valid market price for {symbol}, skipping forced sale.")
+            continue
+        qty = int(pos.position)
+        order = LimitOrder('SELL', qty, round(market_price * 0.99, 2))  # aggressive limit
+        ib.placeOrder(pos.contract, order)
+        print(f"Forced sale: {symbol}, qty={qty}")
+
+def get_last_price(ib, contract, timeout=TICKER_TIMEOUT):
+    """Usable price (last, else close/marketPrice), waiting only as long as the first tick takes (up to timeout)"""
+    ticker = ib.reqMktData(contract, '', False, False)
+    wait_for_prices(ib, [ticker], timeout)
+    ib.cancelMktData(contract)
+    return pick_price(ticker)
 
 def execute_daily_buys_window(ib):
     """Execute daily POTD buys"""
     print("=== Executing Daily Buys ===")
     potd = get_potd()
     positions = ib.positions()
-    existing_symbols = [pos.contract.symbol for pos in positions if pos.account == TARGET_ACCOUNT]
+    existing_symbols = {pos.contract.symbol for pos in positions if pos.account == TARGET_ACCOUNT}
 
     to_buy = [s for s in potd if s not in existing_symbols]
     if not to_buy:
@@ -190,7 +294,7 @@ def execute_daily_buys_window(ib):
 
     for symbol in to_buy:
         contract = Stock(symbol, 'SMART', 'USD')
-        last_price = ib.reqMktData(contract).last
+        last_price = get_last_price(ib, contract)
         if last_price is None or last_price <= 0:
             print(f"Cannot get market price for {symbol}, skipping.")
             continue
@@ -218,31 +322,41 @@ def main():
         print(f"Error connecting: {e}")
         return
 
-    print("Waiting for scheduled windows...")
-    tz = pytz.timezone(TIMEZONE)
+    connect_gsheet()
+    seed_buy_dates(ib)
+    track_open_sells(ib)
 
-    try:
-        while True:
-            now = datetime.now(tz)
+    scheduler = BackgroundScheduler(timezone=TIMEZONE)
 
-            # TP/SL update
-            if now.hour == TP_SL_UPDATE_HOUR and now.minute == TP_SL_UPDATE_MIN:
-                update_tp_sl_daily(ib)
+    scheduler.add_job(enqueue_job, 'cron', args=[update_tp_sl_daily],
+                      hour=TP_SL_UPDATE_HOUR, minute=TP_SL_UPDATE_MIN)
+    print(f"Scheduled TP/SL update at {TP_SL_UPDATE_HOUR:02d}:{TP_SL_UPDATE_MIN:02d} {TIMEZONE}")
 
-            # Forced sales
-            elif (FORCED_SALE_START_HOUR <= now.hour <= FORCED_SALE_END_HOUR and
-                  FORCED_SALE_START_MIN <= now.minute <= FORCED_SALE_END_MIN):
-                execute_forced_sales_window(ib)
+    scheduler.add_job(enqueue_job, 'cron', args=[execute_forced_sales_window],
+                      hour=FORCED_SALE_START_HOUR, minute=FORCED_SALE_START_MIN)
+    print(f"Scheduled forced sales at {FORCED_SALE_START_HOUR:02d}:{FORCED_SALE_START_MIN:02d} {TIMEZONE}")
 
-            # Daily buys
-            elif (DAILY_BUY_START_HOUR <= now.hour <= DAILY_BUY_END_HOUR and
-                  DAILY_BUY_START_MIN <= now.minute <= DAILY_BUY_END_MIN):
-                execute_daily_buys_window(ib)
+    scheduler.add_job(enqueue_job, 'cron', args=[execute_daily_buys_window],
+                      hour=DAILY_BUY_START_HOUR, minute=DAILY_BUY_START_MIN)
+    print(f"Scheduled daily buys at {DAILY_BUY_START_HOUR:02d}:{DAILY_BUY_START_MIN:02d} {TIMEZONE}")
 
-            time.sleep(5)  # check every 5 seconds
+    scheduler.start()
+    print("Waiting for scheduled windows...")
 
-    except KeyboardInterrupt:
+    try:
+        while True:
+            try:
+                job = JOB_QUEUE.get_nowait()
+            except queue.Empty:
+                ib.sleep(IDLE_PUMP)  # keeps order/execution events flowing between jobs
+                continue
+            try:
+                job(ib)
+            except Exception as e:
+                print(f"Error in {job.__name__}: {e}")
+    except (KeyboardInterrupt, SystemExit):
         print("Stopping script...")
+        scheduler.shutdown()
 
     ib.disconnect()
     print("Disconnected from IBKR")
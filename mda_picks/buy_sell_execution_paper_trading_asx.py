@@ -3,24 +3,40 @@ Minimal-change automated trading script (paper trading) for IBKR.
 
 Key points:
 - Fixed $25,000 per buy (ASX testing)
-- TP/SL placed on Day 1 immediately after BUY fill (same as Day 2)
+- TP/SL placed on Day 1 immediately after BUY fill (same as Day 2), as an OCA pair (LMT TP + STP SL)
 - Daily TP/SL update at TP_SL_UPDATE_TIME — cancels only existing SELL orders (TP/SL) per symbol
 - Forced sales (market sell) on Day 6 during FORCED_SALE window
 - Daily buys during BUY window using POTD from Google Sheets (first column)
 - Script can be started earlier than windows; scheduler will wait
+- APScheduler only queues the jobs; they (and every IBKR call) run in the main thread,
+  which owns the connection's event loop and keeps pumping it between and within jobs
 """
-import asyncio
+import logging
 import math
+import queue
+import sqlite3
+import sys
 import time
-from datetime import datetime
+from contextlib import closing
+from datetime import date, datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+import numpy as np
 import pytz
 import gspread
 from apscheduler.schedulers.background import BackgroundScheduler
-from ib_insync import IB, Stock, LimitOrder, MarketOrder, ExecutionFilter
-import pandas as pd
+from ib_insync import IB, Stock, LimitOrder, MarketOrder, StopOrder, ExecutionFilter
 import pandas_market_calendars as mcal
 
+# --- PATH SETUP ---
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
+from utils.utils_ibkr_portfolio import pick_price, wait_for_prices
+
 asx = mcal.get_calendar('ASX')
+logger = logging.getLogger(__name__)
 
 # -------------------------
 # CONFIGURATION (easy to change)
@@ -33,8 +49,10 @@ TARGET_ACCOUNT = 'DUO713598'
 SPREADSHEET_ID = '1gEHjNEI-0Zr-_cMzHsOnEurcA0q2rGtdDgEyRKFgY38'
 TAB_NAME = 'selected_MDA'
 GSHEETS_CREDS = 'service_account_key.json'  # service account JSON
+STATE_DB = 'state_asx.db'                   # local SQLite file persisting buy dates across restarts
 
 TIMEZONE = 'Australia/Sydney'
+TZ = pytz.timezone(TIMEZONE)
 
 # Times
 TP_SL_UPDATE_TIME = (12, 31)      # TP/SL daily update
@@ -46,178 +64,372 @@ DAILY_BUY_END     = (12, 35)     # buy window end
 # Trading params
 FIXED_TRADE_AMOUNT = 25000       # $25k per ticker (ASX testing)
 SLEEP_INTERVAL = 15              # polling delay (seconds)
+IDLE_PUMP = 1                    # seconds the main thread pumps IB events while no job is queued
+POTD_CACHE_TTL = 30              # seconds to reuse the last POTD read from Google Sheets
 AGGRESSIVE_ADJ = 1.001           # multiply last price by this for aggressive limit buys
+
+# TP/SL multipliers indexed by holding day (1-5); day 1 uses the same levels as day 2
+TP_MULT = (None, 1.20, 1.20, 1.15, 1.10, 1.10)
+SL_MULT = (None, 0.85, 0.85, 0.90, 0.90, 0.90)
+TRADING_DAYS_LOOKBACK = 60   # calendar days of ASX sessions cached for holding-day counts
 # -------------------------
 
+_POTD_WORKSHEET = None
+_POTD_CACHE = {'ts': 0, 'value': None}
+BUY_DATES = {}                   # conId -> earliest BOT date, kept current by execution events
+JOB_QUEUE = queue.SimpleQueue()  # jobs handed from scheduler threads to the main (IB) thread
+OPEN_SELLS = {}                  # symbol -> [Trade] of live SELL orders, kept current by order events
+CONTRACT_CACHE = {}              # symbol -> qualified ASX Stock contract
+POSITIONS = {}                   # (account, conId) -> Position, kept current by positionEvent
+_TRADING_DAYS = {'today': None, 'days': None}  # ASX session dates, rebuilt when the date rolls
+
+# ---------- Logging ----------
+def setup_logging():
+    """
+    Route log records through a queue so console I/O happens on the listener
+    thread, not on the thread placing orders. Returns the started listener.
+    """
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s.%(msecs)03d %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))  # timestamp is added by the listener
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    return listener
+
 # ---------- IB / Sheets helpers ----------
 def connect_ibkr():
     """Connect and return IB instance."""
     ib = IB()
     ib.connect(HOST, PORT, clientId=CLIENT_ID, timeout=5)
-    print(f"[{datetime.now()}] Connected to IBKR (clientId={CLIENT_ID})")
+    logger.info("Connected to IBKR (clientId=%s)", CLIENT_ID)
+    ib.execDetailsEvent += on_exec_details
+    ib.commissionReportEvent += on_commission_report
+    ib.openOrderEvent += track_sell_order
+    ib.orderStatusEvent += on_order_status
+    for trade in ib.openTrades():
+        track_sell_order(trade)
+    ib.positionEvent += on_position
+    for pos in ib.positions():
+        on_position(pos)
+    seed_buy_dates(ib)
     return ib
 
-# ---------- asyncio helper ----------
-def ensure_event_loop():
-    """Ensure there is an asyncio event loop in the current thread."""
-    try:
-        loop = asyncio.get_event_loop()
-        if loop.is_closed():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    return loop
+def enqueue_job(job):
+    """Scheduler callback: hand job(ib) to the main thread, which owns the IB connection."""
+    JOB_QUEUE.put(job)
+
+def on_position(pos):
+    """Keep POSITIONS in step with positionEvent; closed positions are dropped."""
+    key = (pos.account, pos.contract.conId)
+    if pos.position:
+        POSITIONS[key] = pos
+    else:
+        POSITIONS.pop(key, None)
+        if pos.account == TARGET_ACCOUNT:
+            forget_buy_date(pos.contract.conId)
 
 def get_positions(ib):
-    """Return positions filtered for TARGET_ACCOUNT."""
-    positions = ib.positions()
-    filtered = [p for p in positions if p.account == TARGET_ACCOUNT]
+    """Return positions filtered for TARGET_ACCOUNT (from the event-fed cache)."""
+    filtered = [p for p in POSITIONS.values() if p.account == TARGET_ACCOUNT]
     syms = [p.contract.symbol for p in filtered]
-    print(f"[{datetime.now()}] Current positions: {syms}")
+    logger.info("Current positions: %s", syms)
     return filtered
 
-def get_positions_with_buy_dates(ib):
-    """Return dict of conId -> buy datetime."""
-    ex_filter = ExecutionFilter()
-    loop = ensure_event_loop()
-    executions = loop.run_until_complete(ib.reqExecutionsAsync(ex_filter))
-    executions = [ex for ex in executions if ex.execution.acctNumber == TARGET_ACCOUNT]
-    buy_dates = {}
-    for ex in executions:
-        if ex.execution.side == 'BOT':
-            conId = ex.execution.conId
-            buy_dates[conId] = pd.to_datetime(ex.execution.time).date()
-    return buy_dates
+def execution_date(ex_time):
+    """Local trading date of an execution time (datetime, or IB's 'YYYYMMDD  HH:MM:SS' string)."""
+    if isinstance(ex_time, str):
+        return datetime.strptime(ex_time, "%Y%m%d  %H:%M:%S").date()
+    if ex_time.tzinfo is not None:
+        ex_time = ex_time.astimezone(TZ)
+    return ex_time.date()
+
+def record_buy_fill(fill):
+    """Fold a single fill into BUY_DATES, keeping the earliest BOT date per conId."""
+    ex = fill.execution
+    if ex.acctNumber != TARGET_ACCOUNT or ex.side != 'BOT':
+        return
+    conId = fill.contract.conId
+    buy_date = execution_date(ex.time)
+    existing = BUY_DATES.get(conId)
+    if existing is None or buy_date < existing:
+        BUY_DATES[conId] = buy_date
+        save_buy_date(conId, buy_date)
+
+def on_exec_details(trade, fill):
+    record_buy_fill(fill)
+
+def on_commission_report(trade, fill, report):
+    record_buy_fill(fill)
+
+# ---------- Buy-date persistence ----------
+def state_db():
+    db = sqlite3.connect(STATE_DB)
+    db.execute('CREATE TABLE IF NOT EXISTS buy_dates(conId INTEGER PRIMARY KEY, ts TEXT)')
+    return db
+
+def load_buy_dates():
+    """Load persisted buy dates into BUY_DATES; returns the number of rows read."""
+    with closing(state_db()) as db:
+        rows = db.execute('SELECT conId, ts FROM buy_dates').fetchall()
+    for conId, ts in rows:
+        BUY_DATES[conId] = date.fromisoformat(ts)
+    return len(rows)
+
+def save_buy_date(conId, buy_date):
+    with closing(state_db()) as db, db:
+        db.execute('INSERT OR REPLACE INTO buy_dates(conId, ts) VALUES (?, ?)', (conId, buy_date.isoformat()))
+
+def forget_buy_date(conId):
+    """Drop a closed position's buy date so a later re-buy starts a fresh holding period."""
+    if BUY_DATES.pop(conId, None) is not None:
+        with closing(state_db()) as db, db:
+            db.execute('DELETE FROM buy_dates WHERE conId = ?', (conId,))
+
+def seed_buy_dates(ib):
+    """
+    Seed BUY_DATES from STATE_DB plus the fills ib_insync synced on connect.
+    The full reqExecutions scan only runs on a cold start (empty state file);
+    later fills arrive via events.
+    """
+    loaded = load_buy_dates()
+    held = {conId for account, conId in POSITIONS if account == TARGET_ACCOUNT}
+    for conId in [c for c in BUY_DATES if c not in held]:
+        forget_buy_date(conId)
+    fills = ib.fills() if loaded else ib.reqExecutions(ExecutionFilter())
+    for fill in fills:
+        record_buy_fill(fill)
+    logger.info("Seeded buy dates for %s contracts (%s from %s)", len(BUY_DATES), loaded, STATE_DB)
+
+def get_potd_worksheet():
+    """Open the POTD worksheet once and reuse it across all scheduled jobs."""
+    global _POTD_WORKSHEET
+    if _POTD_WORKSHEET is None:
+        gc = gspread.service_account(filename=GSHEETS_CREDS)
+        sh = gc.open_by_key(SPREADSHEET_ID)
+        _POTD_WORKSHEET = sh.worksheet(TAB_NAME)
+    return _POTD_WORKSHEET
 
 def get_potd_from_gsheet():
     """Read POTD (first column) from Google Sheets tab."""
-    gc = gspread.service_account(filename=GSHEETS_CREDS)
-    sh = gc.open_by_key(SPREADSHEET_ID)
-    ws = sh.worksheet(TAB_NAME)
+    ws = get_potd_worksheet()
     data = ws.col_values(1)
     potd = [d.strip() for d in data if d.strip()]
-    print(f"[{datetime.now()}] POTD: {potd}")
+    logger.info("POTD: %s", potd)
     return potd
 
+def get_potd_cached(ttl=POTD_CACHE_TTL):
+    """Return POTD, re-reading the sheet only when the cached copy is older than ttl seconds."""
+    if _POTD_CACHE['value'] is None or time.time() - _POTD_CACHE['ts'] >= ttl:
+        _POTD_CACHE['value'] = get_potd_from_gsheet()
+        _POTD_CACHE['ts'] = time.time()
+    return _POTD_CACHE['value']
+
+def contracts_for(ib, symbols):
+    """
+    Return ASX contracts for symbols, qualifying (in one batch) only those not
+    already in CONTRACT_CACHE. Symbols IB can't resolve fall back to a plain Stock.
+    """
+    missing = {s: Stock(s, 'ASX', 'AUD') for s in symbols if s not in CONTRACT_CACHE}
+    if missing:
+        ib.qualifyContracts(*missing.values())
+        for symbol, contract in missing.items():
+            if contract.conId:
+                CONTRACT_CACHE[symbol] = contract
+    return [CONTRACT_CACHE.get(s) or missing[s] for s in symbols]
+
+def contract_for(ib, symbol):
+    return contracts_for(ib, [symbol])[0]
+
+def window_epochs(start, end):
+    """
+    Epoch seconds for today's (start, end) window in TIMEZONE. The end minute is
+    inclusive, so the window closes at end + 60s.
+    """
+    today = datetime.now(TZ).date()
+    start_dt = TZ.localize(datetime(today.year, today.month, today.day, *start))
+    end_dt = TZ.localize(datetime(today.year, today.month, today.day, *end))
+    return start_dt.timestamp(), end_dt.timestamp() + 60
+
+def request_tickers(ib, contracts, wait=2):
+    """
+    Request market data for all contracts back-to-back, wait (pumping the
+    event loop) until every ticker has a price or `wait` seconds pass, then
+    cancel the subscriptions. Returns tickers in the same order as contracts.
+    """
+    tickers = [ib.reqMktData(c, '', False, False) for c in contracts]
+    wait_for_prices(ib, tickers, wait)
+    for c in contracts:
+        ib.cancelMktData(c)
+    return tickers
+
+def trading_days_index(today):
+    """ASX sessions over the lookback window ending today, rebuilt once per day."""
+    if _TRADING_DAYS['today'] != today:
+        schedule = asx.schedule(start_date=today - timedelta(days=TRADING_DAYS_LOOKBACK), end_date=today)
+        _TRADING_DAYS['days'] = schedule.index.values.astype('datetime64[D]')
+        _TRADING_DAYS['today'] = today
+    return _TRADING_DAYS['days']
+
 def trading_days_since(buy_date, today):
-    schedule = asx.schedule(start_date=buy_date, end_date=today)
-    return len(schedule.index) - 1
+    if (today - buy_date).days > TRADING_DAYS_LOOKBACK:
+        schedule = asx.schedule(start_date=buy_date, end_date=today)
+        return len(schedule.index) - 1
+    days = trading_days_index(today)
+    start = np.searchsorted(days, np.datetime64(buy_date, 'D'), side='left')
+    end = np.searchsorted(days, np.datetime64(today, 'D'), side='right')
+    return int(end - start) - 1
 
 # ---------- Order helpers ----------
+def track_sell_order(trade):
+    """Record a live SELL trade in OPEN_SELLS (fed by openOrderEvent and our own placements)."""
+    if trade.order.action.upper() != 'SELL' or trade.isDone():
+        return
+    sells = OPEN_SELLS.setdefault(trade.contract.symbol, [])
+    if not any(t is trade for t in sells):
+        sells.append(trade)
+
+def on_order_status(trade):
+    """Drop completed/cancelled SELL trades from OPEN_SELLS."""
+    if not trade.isDone():
+        return
+    sells = OPEN_SELLS.get(trade.contract.symbol)
+    if sells:
+        sells[:] = [t for t in sells if t is not trade]
+
 def cancel_sell_orders_for_symbol(ib, symbol):
     """Cancel only SELL orders for this symbol (TP/SL)."""
-    open_orders = ib.openOrders()
     canceled = 0
-    for trade in open_orders:
+    for trade in OPEN_SELLS.pop(symbol, []):
         order = trade.order
-        contract = trade.contract
         try:
-            if contract and contract.symbol == symbol and order.action.upper() == 'SELL':
-                ib.cancelOrder(order)
-                canceled += 1
-                print(f"[{datetime.now()}] Canceled SELL order for {symbol} (orderId={order.orderId})")
+            ib.cancelOrder(order)
+            canceled += 1
+            logger.info("Canceled SELL order for %s (orderId=%s)", symbol, order.orderId)
         except Exception as e:
-            print(f"[{datetime.now()}] Error cancelling order for {symbol}: {e}")
+            logger.error("Error cancelling order for %s: %s", symbol, e)
     if canceled == 0:
-        print(f"[{datetime.now()}] No SELL orders to cancel for {symbol}")
+        logger.info("No SELL orders to cancel for %s", symbol)
     return canceled
 
 def place_limit_order(ib, symbol, qty, action, limit_price):
     """Place a simple LMT order and return the trade object."""
-    contract = Stock(symbol, 'ASX', 'AUD')
+    contract = contract_for(ib, symbol)
     order = LimitOrder(action, qty, limit_price)
     trade = ib.placeOrder(contract, order)
-    print(f"[{datetime.now()}] Placed {action} LIMIT for {symbol} qty={qty} @ {limit_price:.2f} (orderId={order.orderId})")
+    logger.info("Placed %s LIMIT for %s qty=%s @ %.2f (orderId=%s)", action, symbol, qty, limit_price, order.orderId)
     return trade
 
-def wait_for_full_fill(ib, trade, qty, window_end_dt):
-    """Wait until the trade is fully filled or window ends."""
-    while True:
-        if trade.isDone():
-            status = trade.orderStatus.status
-            filled = getattr(trade.orderStatus, 'filled', None)
-            print(f"[{datetime.now()}] Order status: {status}, filled={filled}")
-            if status and status.upper() == 'FILLED':
-                return True
-            if filled is not None and filled >= qty:
-                return True
-            return False
-        now = datetime.now(pytz.timezone(TIMEZONE))
-        if now >= window_end_dt:
-            print(f"[{datetime.now()}] Window end reached; order not fully filled.")
-            return False
-        time.sleep(1)
+def is_fully_filled(trade, qty):
+    """True if a finished trade filled the whole quantity."""
+    status = trade.orderStatus.status
+    filled = getattr(trade.orderStatus, 'filled', None)
+    logger.info("Order status: %s, filled=%s", status, filled)
+    if status and status.upper() == 'FILLED':
+        return True
+    return filled is not None and filled >= qty
+
+def wait_for_full_fills(ib, buys, window_end_epoch):
+    """
+    Wait on all submitted buys together, placing Day 1 TP/SL as each one fills.
+    `buys` is a list of (symbol, qty, ref_price, trade). Buys still working at
+    window end are left in place without TP/SL.
+    """
+    pending = list(buys)
+    while pending:
+        for buy in [b for b in pending if b[3].isDone()]:
+            pending.remove(buy)
+            symbol, qty, ref_price, trade = buy
+            if is_fully_filled(trade, qty):
+                # Place TP/SL for Day 1 immediately (same as Day 2)
+                place_tp_sl_for_symbol(ib, symbol, qty, ref_price, day_number=1)
+                logger.info("Buy filled & TP/SL placed for %s.", symbol)
+            else:
+                logger.info("Buy for %s not fully filled in window — TP/SL NOT placed.", symbol)
+        if not pending:
+            break
+        if time.time() >= window_end_epoch:
+            logger.info("Window end reached; orders not fully filled.")
+            for symbol, *_ in pending:
+                logger.info("Buy for %s not fully filled in window — TP/SL NOT placed.", symbol)
+            break
+        ib.waitOnUpdate(timeout=0.2)
 
 # ---------- TP/SL logic ----------
 def tp_sl_prices_from_ref(ref_price, day_number):
-    if day_number in (1, 2):
-        tp = ref_price * 1.2
-        sl = ref_price * 0.85
-    elif day_number == 3:
-        tp = ref_price * 1.15
-        sl = ref_price * 0.9
-    else:  # day 4 & 5
-        tp = ref_price * 1.10
-        sl = ref_price * 0.9
-    return tp, sl
-
-def place_tp_sl_for_symbol(ib, symbol, qty, ref_price, day_number):
-    cancel_sell_orders_for_symbol(ib, symbol)
+    """TP/SL prices for holding days 1-5 (callers route day 6+ to forced sale)."""
+    return ref_price * TP_MULT[day_number], ref_price * SL_MULT[day_number]
+
+def place_tp_sl_for_symbol(ib, symbol, qty, ref_price, day_number, cancel_existing=True):
+    if cancel_existing:
+        cancel_sell_orders_for_symbol(ib, symbol)
     tp, sl = tp_sl_prices_from_ref(ref_price, day_number)
-    contract = Stock(symbol, 'ASX', 'AUD')
-    tp_order = LimitOrder('SELL', qty, round(tp, 2))
-    sl_order = LimitOrder('SELL', qty, round(sl, 2))
-    ib.placeOrder(contract, tp_order)
-    ib.placeOrder(contract, sl_order)
-    print(f"[{datetime.now()}] Placed TP/SL for {symbol} qty={qty} | TP={tp:.2f} SL={sl:.2f}")
+    contract = contract_for(ib, symbol)
+    # TP and SL share an OCA group so a fill on one cancels the other;
+    # SL is a stop (not a limit) so it still triggers if price gaps through it
+    oca_group = f"{symbol}_tpsl_{datetime.now():%Y%m%d%H%M%S}"
+    tp_order = LimitOrder('SELL', qty, round(tp, 2), ocaGroup=oca_group, ocaType=1)
+    sl_order = StopOrder('SELL', qty, round(sl, 2), ocaGroup=oca_group, ocaType=1)
+    # Both legs keep transmit=True: placeOrder only queues the message (no round-trip
+    # per leg), and TWS releases a transmit=False order only with its parentId
+    # child chain, never via an OCA sibling — a held TP would never go live
+    track_sell_order(ib.placeOrder(contract, tp_order))
+    track_sell_order(ib.placeOrder(contract, sl_order))
+    logger.info("Placed TP/SL for %s qty=%s | TP=%.2f SL=%.2f", symbol, qty, tp, sl)
 
 # ---------- Scheduled tasks ----------
 def update_tp_sl_daily(ib):
-    ensure_event_loop()
-    tz = pytz.timezone(TIMEZONE)
-    today = datetime.now(tz).date()
-    print(f"[{datetime.now()}] Running daily TP/SL update...")
+    today = datetime.now(TZ).date()
+    logger.info("Running daily TP/SL update...")
     positions = get_positions(ib)
-    buy_dates = get_positions_with_buy_dates(ib)
+    if not positions:
+        logger.info("No open positions, nothing to update.")
+        return
+    pending = []
     for pos in positions:
         symbol = pos.contract.symbol
-        buy_date = buy_dates.get(pos.contract.conId)
+        buy_date = BUY_DATES.get(pos.contract.conId)
         if not buy_date:
-            print(f"[{datetime.now()}] No buy date for {symbol} — skipping.")
+            logger.info("No buy date for %s — skipping.", symbol)
             continue
         day_number = (today - buy_date).days + 1
         if day_number >= 6:
-            print(f"[{datetime.now()}] {symbol} is day {day_number} (>=6) — handled by forced sale.")
+            logger.info("%s is day %s (>=6) — handled by forced sale.", symbol, day_number)
             continue
-        ref_price = pos.marketPrice if pos.marketPrice else None
-        if not ref_price:
-            ticker = ib.reqMktData(pos.contract)
-            time.sleep(0.5)
-            ref_price = getattr(ticker, 'last', float('nan'))
-            if math.isnan(ref_price):
-                print(f"[{datetime.now()}] No valid market price for {symbol} — skipping.")
-                continue
-        place_tp_sl_for_symbol(ib, symbol, int(pos.position), ref_price, day_number)
+        pending.append((pos, day_number))
+
+    # Positions carry no market price, so price every pending position in one batch
+    tickers = request_tickers(ib, [pos.contract for pos, _ in pending]) if pending else []
+
+    # Resolve reference prices first: a symbol without one keeps its existing TP/SL
+    priced = []
+    for (pos, day_number), ticker in zip(pending, tickers):
+        ref_price = pick_price(ticker)
+        if ref_price is None:
+            logger.info("No valid market price for %s — skipping.", pos.contract.symbol)
+            continue
+        priced.append((pos, day_number, ref_price))
+
+    # Cancel the tracked TP/SL of every priced symbol in one pass, then place the new ones
+    for pos, _, _ in priced:
+        cancel_sell_orders_for_symbol(ib, pos.contract.symbol)
+
+    for pos, day_number, ref_price in priced:
+        place_tp_sl_for_symbol(ib, pos.contract.symbol, int(pos.position), ref_price, day_number,
+                               cancel_existing=False)
 
 def execute_forced_sales_window(ib):
-    ensure_event_loop()
-    tz = pytz.timezone(TIMEZONE)
-    start_h, start_m = FORCED_SALE_START
-    end_h, end_m = FORCED_SALE_END
-    print(f"[{datetime.now()}] Forced sale window starting ({FORCED_SALE_START} -> {FORCED_SALE_END})")
+    start_epoch, end_epoch = window_epochs(FORCED_SALE_START, FORCED_SALE_END)
+    today = datetime.now(TZ).date()
+    logger.info("Forced sale window starting (%s -> %s)", FORCED_SALE_START, FORCED_SALE_END)
     while True:
-        now = datetime.now(tz)
-        in_window = ((now.hour > start_h or (now.hour == start_h and now.minute >= start_m)) and
-                     (now.hour < end_h or (now.hour == end_h and now.minute <= end_m)))
-        if in_window:
+        if start_epoch <= time.time() < end_epoch:
             positions = get_positions(ib)
-            buy_dates = get_positions_with_buy_dates(ib)
-            today = now.date()
             for pos in positions:
                 symbol = pos.contract.symbol
-                buy_date = buy_dates.get(pos.contract.conId)
+                buy_date = BUY_DATES.get(pos.contract.conId)
                 if buy_date:
                     tdays = trading_days_since(buy_date, today)
                     if tdays >= 5:  # 6th trading day
@@ -226,10 +438,10 @@ def execute_forced_sales_window(ib):
                             continue
                         order = MarketOrder('SELL', qty)
                         ib.placeOrder(pos.contract, order)
-                        print(f"[{datetime.now()}] Forced MARKET SELL placed for {symbol} qty={qty}.")
-            time.sleep(SLEEP_INTERVAL)
+                        logger.info("Forced MARKET SELL placed for %s qty=%s.", symbol, qty)
+            ib.sleep(SLEEP_INTERVAL)  # pumps IB so the event-fed caches stay current
         else:
-            print(f"[{datetime.now()}] Forced sale window ended/exited.")
+            logger.info("Forced sale window ended/exited.")
             break
 
 def execute_daily_buys_window(ib):
@@ -237,48 +449,36 @@ def execute_daily_buys_window(ib):
     Repeatedly run during DAILY_BUY_START -> DAILY_BUY_END.
     For each POTD not already in account:
       - compute qty = floor(FIXED_TRADE_AMOUNT / last_price)
-      - place LIMIT BUY at last * AGGRESSIVE_ADJ
-      - wait for full fill until window end; if filled -> place TP/SL for day 1
+      - place LIMIT BUY at last * AGGRESSIVE_ADJ (all symbols submitted in one pass)
+      - wait for full fills until window end; as each fills -> place TP/SL for day 1
       - if not filled by window end -> leave buy order (no TP/SL)
     """
 
-    # Ensure event loop exists in this thread
-    ensure_event_loop()
-
-    tz = pytz.timezone(TIMEZONE)
-    start_h, start_m = DAILY_BUY_START
-    end_h, end_m = DAILY_BUY_END
-    print(f"[{datetime.now()}] Daily buy window starting (window {DAILY_BUY_START} -> {DAILY_BUY_END})")
+    start_epoch, end_epoch = window_epochs(DAILY_BUY_START, DAILY_BUY_END)
+    logger.info("Daily buy window starting (window %s -> %s)", DAILY_BUY_START, DAILY_BUY_END)
 
     while True:
-        now = datetime.now(tz)
-        in_window = ((now.hour > start_h or (now.hour == start_h and now.minute >= start_m)) and
-                     (now.hour < end_h or (now.hour == end_h and now.minute <= end_m)))
-        if in_window:
-            potd = get_potd_from_gsheet()
+        if start_epoch <= time.time() < end_epoch:
+            potd = get_potd_cached()
             positions = get_positions(ib)
             existing = {p.contract.symbol for p in positions}
             to_buy = [s for s in potd if s not in existing]
 
             if not to_buy:
-                print(f"[{datetime.now()}] No new symbols to buy this run.")
+                logger.info("No new symbols to buy this run.")
             else:
-                window_end_dt = datetime(now.year, now.month, now.day, end_h, end_m, tzinfo=tz)
-                for symbol in to_buy:
-                    contract = Stock(symbol, 'ASX', 'AUD')
-                    ticker = ib.reqMktData(contract, '', False, False)  # normal request
-                    time.sleep(1)  # allow ticker to update
-
-                    last_price = getattr(ticker, 'last', None)
-
-                    # Fallback to delayed/close price if real-time last_price is unavailable
-                    if last_price is None or math.isnan(last_price):
-                        last_price = getattr(ticker, 'close', None)
-                        if last_price is not None:
-                            print(f"[{datetime.now()}] Using delayed/close price for {symbol}: {last_price}")
-                        else:
-                            print(f"[{datetime.now()}] No valid market price for {symbol} even in close — skipping.")
-                            continue
+                contracts = contracts_for(ib, to_buy)
+                tickers = request_tickers(ib, contracts)  # one wait for all symbols
+
+                buys = []
+                for symbol, ticker in zip(to_buy, tickers):
+                    # pick_price falls back to the delayed/close price if real-time last is unavailable
+                    last_price = pick_price(ticker)
+                    if last_price is None:
+                        logger.info("No valid market price for %s even in close — skipping.", symbol)
+                        continue
+                    if last_price != ticker.last:
+                        logger.info("Using delayed/close price for %s: %s", symbol, last_price)
 
                     qty = math.floor(FIXED_TRADE_AMOUNT / last_price)
 
@@ -287,54 +487,60 @@ def execute_daily_buys_window(ib):
                         qty = math.ceil(500 / last_price)
 
                     if qty <= 0:
-                        print(f"[{datetime.now()}] Qty computed as 0 for {symbol} (@{last_price}) — skipping.")
+                        logger.info("Qty computed as 0 for %s (@%s) — skipping.", symbol, last_price)
                         continue
 
                     limit_price = round(last_price * AGGRESSIVE_ADJ, 2)
                     trade = place_limit_order(ib, symbol, qty, 'BUY', limit_price)
-                    filled = wait_for_full_fill(ib, trade, qty, window_end_dt)
-
-                    if filled:
-                        # Place TP/SL for Day 1 immediately (same as Day 2)
-                        place_tp_sl_for_symbol(ib, symbol, qty, last_price, day_number=1)
-                        print(f"[{datetime.now()}] Buy filled & TP/SL placed for {symbol}.")
-                    else:
-                        print(f"[{datetime.now()}] Buy for {symbol} not fully filled in window — TP/SL NOT placed.")
-            time.sleep(SLEEP_INTERVAL)
+                    buys.append((symbol, qty, last_price, trade))
+
+                # All buys are working at once; fills are handled as they arrive
+                wait_for_full_fills(ib, buys, end_epoch)
+            ib.sleep(SLEEP_INTERVAL)  # pumps IB so the event-fed caches stay current
         else:
-            print(f"[{datetime.now()}] Buy window ended/exited.")
+            logger.info("Buy window ended/exited.")
             break
 
 
 # ---------- Main / scheduler ----------
 def main():
+    listener = setup_logging()
     ib = connect_ibkr()
-    tz = pytz.timezone(TIMEZONE)
+    get_potd_worksheet()
     scheduler = BackgroundScheduler(timezone=TIMEZONE)
 
-    scheduler.add_job(lambda: update_tp_sl_daily(ib), 'cron',
+    scheduler.add_job(enqueue_job, 'cron', args=[update_tp_sl_daily],
                       hour=TP_SL_UPDATE_TIME[0], minute=TP_SL_UPDATE_TIME[1])
-    print(f"[{datetime.now()}] Scheduled TP/SL daily update at {TP_SL_UPDATE_TIME} {TIMEZONE}")
+    logger.info("Scheduled TP/SL daily update at %s %s", TP_SL_UPDATE_TIME, TIMEZONE)
 
-    scheduler.add_job(lambda: execute_forced_sales_window(ib), 'cron',
+    scheduler.add_job(enqueue_job, 'cron', args=[execute_forced_sales_window],
                       hour=FORCED_SALE_START[0], minute=FORCED_SALE_START[1])
-    print(f"[{datetime.now()}] Scheduled forced sale window start at {FORCED_SALE_START} {TIMEZONE}")
+    logger.info("Scheduled forced sale window start at %s %s", FORCED_SALE_START, TIMEZONE)
 
-    scheduler.add_job(lambda: execute_daily_buys_window(ib), 'cron',
+    scheduler.add_job(enqueue_job, 'cron', args=[execute_daily_buys_window],
                       hour=DAILY_BUY_START[0], minute=DAILY_BUY_START[1])
-    print(f"[{datetime.now()}] Scheduled daily buy window start at {DAILY_BUY_START} {TIMEZONE}")
+    logger.info("Scheduled daily buy window start at %s %s", DAILY_BUY_START, TIMEZONE)
 
     scheduler.start()
-    print(f"[{datetime.now()}] Scheduler started. Script running and waiting for windows...")
+    logger.info("Scheduler started. Script running and waiting for windows...")
 
     try:
         while True:
-            time.sleep(60)
+            try:
+                job = JOB_QUEUE.get_nowait()
+            except queue.Empty:
+                ib.sleep(IDLE_PUMP)  # keeps order/execution/position events flowing between jobs
+                continue
+            try:
+                job(ib)
+            except Exception:
+                logger.exception("Error in %s", job.__name__)
     except (KeyboardInterrupt, SystemExit):
-        print(f"[{datetime.now()}] Stopping scheduler and disconnecting IB...")
+        logger.info("Stopping scheduler and disconnecting IB...")
         scheduler.shutdown()
         ib.disconnect()
-        print(f"[{datetime.now()}] Shutdown complete.")
+        logger.info("Shutdown complete.")
+        listener.stop()
 
 if __name__ == '__main__':
     main()
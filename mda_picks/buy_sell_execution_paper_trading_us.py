@@ -5,16 +5,21 @@ Key points:
 - Fixed $25,000 per buy
 - TP/SL placed on Day 1 immediately after BUY fill (same as Day 2)
 - Daily TP/SL update at TP_SL_UPDATE_TIME — cancels only existing SELL orders (TP/SL)
-- Forced sales (market sell) on Day 6 during FORCED_SALE window
-- Daily buys during BUY window using POTD from Google Sheets (first column)
+- Forced sales (market sell) on Day 6, one pass at FORCED_SALE_START
+- Daily buys, one pass at DAILY_BUY_START using POTD from Google Sheets (first column)
 - Uses snapshot mode for delayed US prices
 - Buys/sells executed as MARKET orders
 """
 
 import asyncio
 import math
+import sys
+import threading
 import time
-from datetime import datetime
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+import numpy as np
 import pytz
 import gspread
 from apscheduler.schedulers.background import BackgroundScheduler
@@ -22,6 +27,13 @@ from ib_insync import IB, Stock, MarketOrder, ExecutionFilter
 import pandas as pd
 import pandas_market_calendars as mcal
 
+# --- PATH SETUP ---
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
+from utils.utils_ibkr_portfolio import pick_price, request_snapshots
+
 # ---------- Configuration ----------
 HOST = '127.0.0.1'
 PORT = 7497
@@ -33,6 +45,7 @@ TAB_NAME = 'selected_MDA'
 GSHEETS_CREDS = 'service_account_key.json'
 
 TIMEZONE = 'US/Eastern'
+TZ = pytz.timezone(TIMEZONE)
 
 TP_SL_UPDATE_TIME = (13, 51)
 FORCED_SALE_START = (13, 51)
@@ -41,10 +54,21 @@ DAILY_BUY_START   = (13, 51)
 DAILY_BUY_END     = (13, 52)
 
 FIXED_TRADE_AMOUNT = 25000
-SLEEP_INTERVAL = 15
+POTD_CACHE_TTL = 60        # seconds to reuse the last POTD read from Google Sheets
+BUY_DATES_CACHE_TTL = 30   # seconds to reuse one reqExecutions scan across jobs in the same tick
+TRADING_DAYS_LOOKBACK = 60 # calendar days of NYSE sessions cached for holding-day counts
+
+# TP/SL multipliers indexed by holding day (1-5); day 1 uses the same levels as day 2
+TP_MULT = (None, 1.20, 1.20, 1.15, 1.10, 1.10)
+SL_MULT = (None, 0.85, 0.85, 0.90, 0.90, 0.90)
 
 usa = mcal.get_calendar('NYSE')
 
+_POTD_WORKSHEET = None
+_POTD_CACHE = {'ts': 0, 'value': None}
+_BUY_DATES_CACHE = {'ts': 0, 'value': None}
+_TRADING_DAYS = {'today': None, 'days': None}  # NYSE session dates, rebuilt when the date rolls
+
 # ---------- IB / Sheets helpers ----------
 def connect_ibkr():
     ib = IB()
@@ -72,10 +96,19 @@ def get_positions(ib):
     print(f"[{datetime.now()}] Current positions: {syms}")
     return filtered
 
-def get_positions_with_buy_dates(ib):
+def get_positions_with_buy_dates(ib, ttl=BUY_DATES_CACHE_TTL):
+    """
+    conId -> buy date from execution history. Jobs firing in the same tick
+    (e.g. TP/SL update and forced sales) share one reqExecutions scan.
+    """
+    if _BUY_DATES_CACHE['value'] is None or time.time() - _BUY_DATES_CACHE['ts'] >= ttl:
+        _BUY_DATES_CACHE['value'] = fetch_buy_dates(ib)
+        _BUY_DATES_CACHE['ts'] = time.time()
+    return _BUY_DATES_CACHE['value']
+
+def fetch_buy_dates(ib):
     ex_filter = ExecutionFilter()
-    loop = ensure_event_loop()
-    executions = loop.run_until_complete(ib.reqExecutionsAsync(ex_filter))
+    executions = ib.reqExecutions(ex_filter)
     executions = [ex for ex in executions if ex.execution.acctNumber == TARGET_ACCOUNT]
     buy_dates = {}
     for ex in executions:
@@ -84,32 +117,77 @@ def get_positions_with_buy_dates(ib):
             buy_dates[conId] = pd.to_datetime(ex.execution.time).date()
     return buy_dates
 
+def get_potd_worksheet():
+    """Open the POTD worksheet once and reuse it across all scheduled jobs."""
+    global _POTD_WORKSHEET
+    if _POTD_WORKSHEET is None:
+        gc = gspread.service_account(filename=GSHEETS_CREDS)
+        sh = gc.open_by_key(SPREADSHEET_ID)
+        _POTD_WORKSHEET = sh.worksheet(TAB_NAME)
+    return _POTD_WORKSHEET
+
 def get_potd_from_gsheet():
-    gc = gspread.service_account(filename=GSHEETS_CREDS)
-    sh = gc.open_by_key(SPREADSHEET_ID)
-    ws = sh.worksheet(TAB_NAME)
+    ws = get_potd_worksheet()
     data = ws.col_values(1)
     potd = [d.strip() for d in data if d.strip()]
     print(f"[{datetime.now()}] POTD: {potd}")
     # Return as list of dicts for snapshot function
     return [{"symbol": s, "exchange": "SMART", "currency": "USD"} for s in potd]
 
+def get_potd_cached(ttl=POTD_CACHE_TTL):
+    """Return POTD, re-reading the sheet only when the cached copy is older than ttl seconds."""
+    if _POTD_CACHE['value'] is None or time.time() - _POTD_CACHE['ts'] >= ttl:
+        _POTD_CACHE['value'] = get_potd_from_gsheet()
+        _POTD_CACHE['ts'] = time.time()
+    return _POTD_CACHE['value']
+
+def window_bounds(start, end):
+    """
+    Today's (start_dt, end_dt) in TIMEZONE for a window given as (hour, minute)
+    pairs. The end minute is inclusive, so end_dt is one minute past it.
+    """
+    today = datetime.now(TZ).date()
+    start_dt = TZ.localize(datetime(today.year, today.month, today.day, *start))
+    end_dt = TZ.localize(datetime(today.year, today.month, today.day, *end)) + timedelta(minutes=1)
+    return start_dt, end_dt
+
+def trading_days_index(today):
+    """NYSE sessions over the lookback window ending today, rebuilt once per day."""
+    if _TRADING_DAYS['today'] != today:
+        schedule = usa.schedule(start_date=today - timedelta(days=TRADING_DAYS_LOOKBACK), end_date=today)
+        _TRADING_DAYS['days'] = schedule.index.values.astype('datetime64[D]')
+        _TRADING_DAYS['today'] = today
+    return _TRADING_DAYS['days']
+
 def trading_days_since(buy_date, today):
-    schedule = usa.schedule(start_date=buy_date, end_date=today)
-    return len(schedule.index) - 1
+    if (today - buy_date).days > TRADING_DAYS_LOOKBACK:
+        schedule = usa.schedule(start_date=buy_date, end_date=today)
+        return len(schedule.index) - 1
+    days = trading_days_index(today)
+    start = np.searchsorted(days, np.datetime64(buy_date, 'D'), side='left')
+    end = np.searchsorted(days, np.datetime64(today, 'D'), side='right')
+    return int(end - start) - 1
 
 # ---------- Order helpers ----------
-def cancel_sell_orders_for_symbol(ib, symbol):
-    open_orders = ib.openOrders()
+def index_open_sells(ib):
+    """Group open SELL trades by symbol so a run can cancel per symbol without rescanning."""
+    idx = defaultdict(list)
+    for trade in ib.openTrades():
+        if trade.contract and trade.order.action.upper() == 'SELL':
+            idx[trade.contract.symbol].append(trade)
+    return idx
+
+def cancel_sell_orders_for_symbol(ib, symbol, idx=None):
+    """Cancel open SELL orders for symbol; pass idx from index_open_sells to reuse one scan."""
+    if idx is None:
+        idx = index_open_sells(ib)
     canceled = 0
-    for trade in open_orders:
+    for trade in idx.pop(symbol, []):
         order = trade.order
-        contract = trade.contract
         try:
-            if contract and contract.symbol == symbol and order.action.upper() == 'SELL':
-                ib.cancelOrder(order)
-                canceled += 1
-                print(f"[{datetime.now()}] Canceled SELL order for {symbol} (orderId={order.orderId})")
+            ib.cancelOrder(order)
+            canceled += 1
+            print(f"[{datetime.now()}] Canceled SELL order for {symbol} (orderId={order.orderId})")
         except Exception as e:
             print(f"[{datetime.now()}] Error cancelling order for {symbol}: {e}")
     if canceled == 0:
@@ -123,21 +201,48 @@ def place_market_order(ib, symbol, qty, action):
     print(f"[{datetime.now()}] Placed {action} MARKET order for {symbol} qty={qty} (orderId={order.orderId})")
     return trade
 
+def is_fully_filled(trade, qty):
+    """True if a finished trade filled the whole quantity."""
+    status = trade.orderStatus.status
+    filled = getattr(trade.orderStatus, 'filled', None)
+    print(f"[{datetime.now()}] Order status: {status}, filled={filled}")
+    if status and status.upper() == 'FILLED':
+        return True
+    return filled is not None and filled >= qty
+
+def wait_for_full_fills(ib, buys, window_end_dt):
+    """
+    Wait on all submitted buys together, placing Day 1 TP/SL as each one fills.
+    `buys` is a list of (symbol, qty, ref_price, trade). Buys still working at
+    window end are left in place without TP/SL.
+    """
+    window_end_epoch = window_end_dt.timestamp()  # compared against time.time() on every wakeup
+    pending = list(buys)
+    while pending:
+        for buy in [b for b in pending if b[3].isDone()]:
+            pending.remove(buy)
+            symbol, qty, ref_price, trade = buy
+            if is_fully_filled(trade, qty):
+                place_tp_sl_for_symbol(ib, symbol, qty, ref_price, day_number=1)
+                print(f"[{datetime.now()}] Buy filled & TP/SL placed for {symbol}.")
+            else:
+                print(f"[{datetime.now()}] Buy for {symbol} not fully filled in window — TP/SL NOT placed.")
+        if not pending:
+            break
+        if time.time() >= window_end_epoch:
+            print(f"[{datetime.now()}] Window end reached; orders not fully filled.")
+            for symbol, *_ in pending:
+                print(f"[{datetime.now()}] Buy for {symbol} not fully filled in window — TP/SL NOT placed.")
+            break
+        ib.waitOnUpdate(timeout=0.2)
+
 # ---------- TP/SL ----------
 def tp_sl_prices_from_ref(ref_price, day_number):
-    if day_number in (1, 2):
-        tp = ref_price * 1.2
-        sl = ref_price * 0.85
-    elif day_number == 3:
-        tp = ref_price * 1.15
-        sl = ref_price * 0.9
-    else:
-        tp = ref_price * 1.10
-        sl = ref_price * 0.9
-    return tp, sl
-
-def place_tp_sl_for_symbol(ib, symbol, qty, ref_price, day_number):
-    cancel_sell_orders_for_symbol(ib, symbol)
+    """TP/SL prices for holding days 1-5 (callers route day 6+ to forced sale)."""
+    return ref_price * TP_MULT[day_number], ref_price * SL_MULT[day_number]
+
+def place_tp_sl_for_symbol(ib, symbol, qty, ref_price, day_number, idx=None):
+    cancel_sell_orders_for_symbol(ib, symbol, idx)
     tp, sl = tp_sl_prices_from_ref(ref_price, day_number)
     contract = Stock(symbol, 'SMART', 'USD')
     tp_order = MarketOrder('SELL', qty)  # Market order for TP
@@ -149,137 +254,121 @@ def place_tp_sl_for_symbol(ib, symbol, qty, ref_price, day_number):
 # ---------- Scheduled tasks ----------
 def update_tp_sl_daily(ib):
     ensure_event_loop()
-    tz = pytz.timezone(TIMEZONE)
-    today = datetime.now(tz).date()
+    today = datetime.now(TZ).date()
     positions = get_positions(ib)
     buy_dates = get_positions_with_buy_dates(ib)
+    pending = []
     for pos in positions:
-        symbol = pos.contract.symbol
         buy_date = buy_dates.get(pos.contract.conId)
         if not buy_date:
             continue
         day_number = (today - buy_date).days + 1
         if day_number >= 6:
             continue
-        # Snapshot price
-        ticker = ib.reqMktData(pos.contract, snapshot=True)
-        ib.sleep(2)
-        ref_price = ticker.last or ticker.close
-        if not ref_price or math.isnan(ref_price):
+        pending.append((pos, day_number))
+
+    # Snapshot prices for every position in one batch
+    tickers = request_snapshots(ib, [pos.contract for pos, _ in pending], wait=2) if pending else []
+    open_sells = index_open_sells(ib)  # one scan of open orders for the whole run
+    for (pos, day_number), ticker in zip(pending, tickers):
+        symbol = pos.contract.symbol
+        ref_price = pick_price(ticker)
+        if ref_price is None:
             print(f"No valid market price for {symbol} — skipping TP/SL")
             continue
-        place_tp_sl_for_symbol(ib, symbol, int(pos.position), ref_price, day_number)
+        place_tp_sl_for_symbol(ib, symbol, int(pos.position), ref_price, day_number, open_sells)
 
 def execute_forced_sales_window(ib):
+    """
+    Fired once at FORCED_SALE_START: one pass that MARKET SELLs positions on
+    their 6th trading day. A single pass avoids re-submitting sells for
+    positions whose first sell has not filled yet.
+    """
     ensure_event_loop()
-    tz = pytz.timezone(TIMEZONE)
-    start_h, start_m = FORCED_SALE_START
-    end_h, end_m = FORCED_SALE_END
-    while True:
-        now = datetime.now(tz)
-        in_window = ((now.hour > start_h or (now.hour == start_h and now.minute >= start_m)) and
-                     (now.hour < end_h or (now.hour == end_h and now.minute <= end_m)))
-        if in_window:
-            positions = get_positions(ib)
-            buy_dates = get_positions_with_buy_dates(ib)
-            today = now.date()
-            for pos in positions:
-                symbol = pos.contract.symbol
-                buy_date = buy_dates.get(pos.contract.conId)
-                if buy_date:
-                    tdays = trading_days_since(buy_date, today)
-                    if tdays >= 5:
-                        qty = int(pos.position)
-                        if qty <= 0:
-                            continue
-                        place_market_order(ib, symbol, qty, 'SELL')
-            time.sleep(SLEEP_INTERVAL)
-        else:
-            break
+    start_dt, end_dt = window_bounds(FORCED_SALE_START, FORCED_SALE_END)
+    now = datetime.now(TZ)
+    if not start_dt <= now < end_dt:
+        print(f"[{datetime.now()}] Not in forced sale window. Exiting.")
+        return
+
+    positions = get_positions(ib)
+    buy_dates = get_positions_with_buy_dates(ib)
+    today = now.date()
+    for pos in positions:
+        symbol = pos.contract.symbol
+        buy_date = buy_dates.get(pos.contract.conId)
+        if buy_date:
+            tdays = trading_days_since(buy_date, today)
+            if tdays >= 5:
+                qty = int(pos.position)
+                if qty <= 0:
+                    continue
+                place_market_order(ib, symbol, qty, 'SELL')
 
 def execute_daily_buys_window(ib):
     """
-    Repeatedly run during DAILY_BUY_START -> DAILY_BUY_END.
-    For each POTD not already in account:
+    Fired once at DAILY_BUY_START. For each POTD not already in account:
       - compute qty = floor(FIXED_TRADE_AMOUNT / last_price)
       - place MARKET BUY immediately
-      - place TP/SL for Day 1 immediately after fill
+      - place TP/SL for Day 1 as each buy fills (waiting until DAILY_BUY_END)
     """
 
     ensure_event_loop()
-    tz = pytz.timezone(TIMEZONE)
-    start_h, start_m = DAILY_BUY_START
-    end_h, end_m = DAILY_BUY_END
+    start_dt, end_dt = window_bounds(DAILY_BUY_START, DAILY_BUY_END)
     print(f"[{datetime.now()}] Daily buy window starting (window {DAILY_BUY_START} -> {DAILY_BUY_END})")
 
-    while True:
-        now = datetime.now(tz)
-        in_window = ((now.hour > start_h or (now.hour == start_h and now.minute >= start_m)) and
-                     (now.hour < end_h or (now.hour == end_h and now.minute <= end_m)))
-        if in_window:
-            potd = get_potd_from_gsheet()  # list of dicts: [{"symbol":..., "exchange":..., "currency":...}]
-            positions = get_positions(ib)
-            existing = {p.contract.symbol for p in positions}
-            to_buy = [s for s in potd if s["symbol"] not in existing]
-
-            if not to_buy:
-                print(f"[{datetime.now()}] No new symbols to buy this run.")
-            else:
-                window_end_dt = datetime(now.year, now.month, now.day, end_h, end_m, tzinfo=tz)
-                for s in to_buy:
-                    symbol = s["symbol"]
-                    print(f"Running numbers for {symbol} right now.")
-
-                    contract = Stock(symbol, s["exchange"], s["currency"])
-
-                    print(f"{contract}")
-                    # Request snapshot (delayed) price
-                    ib.reqMarketDataType(3)  # delayed price
-                    ticker = ib.reqMktData(contract, snapshot=True)
-                    print(f"{ticker}")
-                    ib.sleep(5)  # give IBKR a moment to populate data
-
-                    last_price = None
-                    if ticker.last and not math.isnan(ticker.last):
-                        last_price = ticker.last
-                    elif ticker.close and not math.isnan(ticker.close):
-                        last_price = ticker.close
-
-                    print(f"{symbol}, {last_price}, {ticker.last}, {ticker.close}")
-
-                    if not last_price:
-                        print(f"[{datetime.now()}] No valid market price for {symbol} (even delayed) — skipping.")
-                        continue
-
-                    qty = math.floor(FIXED_TRADE_AMOUNT / last_price)
-                    if qty <= 0:
-                        print(f"[{datetime.now()}] Qty computed as 0 for {symbol} (@{last_price}) — skipping.")
-                        continue
-
-                    # Use MARKET BUY to ensure execution
-                    order = MarketOrder('BUY', qty)
-                    trade = ib.placeOrder(contract, order)
-                    print(f"[{datetime.now()}] MARKET BUY placed for {symbol} qty={qty}")
-
-                    filled = wait_for_full_fill(ib, trade, qty, window_end_dt)
-                    if filled:
-                        place_tp_sl_for_symbol(ib, symbol, qty, last_price, day_number=1)
-                        print(f"[{datetime.now()}] Buy filled & TP/SL placed for {symbol}.")
-                    else:
-                        print(f"[{datetime.now()}] Buy for {symbol} not fully filled in window — TP/SL NOT placed.")
-
-            time.sleep(SLEEP_INTERVAL)
-        else:
-            print(f"[{datetime.now()}] Buy window ended/exited.")
-            break
+    now = datetime.now(TZ)
+    if not start_dt <= now < end_dt:
+        print(f"[{datetime.now()}] Not in buy window. Exiting.")
+        return
+
+    potd = get_potd_cached()  # list of dicts: [{"symbol":..., "exchange":..., "currency":...}]
+    positions = get_positions(ib)
+    existing = {p.contract.symbol for p in positions}
+    to_buy = [s for s in potd if s["symbol"] not in existing]
+
+    if not to_buy:
+        print(f"[{datetime.now()}] No new symbols to buy this run.")
+        return
+
+    contracts = [Stock(s["symbol"], s["exchange"], s["currency"]) for s in to_buy]
+    # Request snapshot (delayed, set once in connect_ibkr) prices for all symbols at once
+    tickers = request_snapshots(ib, contracts, wait=5)  # one wait for all symbols
+
+    buys = []
+    for s, contract, ticker in zip(to_buy, contracts, tickers):
+        symbol = s["symbol"]
+        print(f"Running numbers for {symbol} right now.")
+        print(f"{ticker}")
+
+        last_price = pick_price(ticker)
+
+        print(f"{symbol}, {last_price}, {ticker.last}, {ticker.close}")
+
+        if not last_price:
+            print(f"[{datetime.now()}] No valid market price for {symbol} (even delayed) — skipping.")
+            continue
+
+        qty = math.floor(FIXED_TRADE_AMOUNT / last_price)
+        if qty <= 0:
+            print(f"[{datetime.now()}] Qty computed as 0 for {symbol} (@{last_price}) — skipping.")
+            continue
 
+        # Use MARKET BUY to ensure execution
+        order = MarketOrder('BUY', qty)
+        trade = ib.placeOrder(contract, order)
+        print(f"[{datetime.now()}] MARKET BUY placed for {symbol} qty={qty}")
+        buys.append((symbol, qty, last_price, trade))
 
+    # All buys are in flight; wait on them together
+    wait_for_full_fills(ib, buys, end_dt)
+    print(f"[{datetime.now()}] Buy window pass complete.")
 
 
 # ---------- Main ----------
 def main():
     ib = connect_ibkr()
-    tz = pytz.timezone(TIMEZONE)
+    get_potd_worksheet()
     scheduler = BackgroundScheduler(timezone=TIMEZONE)
 
     # TP/SL daily update
@@ -300,8 +389,7 @@ def main():
 
     scheduler.start()
     try:
-        while True:
-            time.sleep(60)
+        threading.Event().wait()  # sleeps until Ctrl-C; no periodic wakeups
     except (KeyboardInterrupt, SystemExit):
         scheduler.shutdown()
         ib.disconnect()
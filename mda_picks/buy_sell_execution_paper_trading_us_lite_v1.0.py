@@ -1,9 +1,17 @@
-import time
+import sys
 import math
 from datetime import datetime
+from pathlib import Path
 import gspread
 from ib_insync import IB, Stock, MarketOrder, LimitOrder
 
+# --- PATH SETUP ---
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
+from utils.utils_ibkr_portfolio import pick_price, request_snapshots
+
 # -------------------------
 # CONFIG
 HOST = '127.0.0.1'
@@ -48,19 +56,22 @@ def main():
 
     tickers = get_potd_from_gsheet()
 
+    # Skip symbols already held before requesting any market data
+    held = {p.contract.symbol for p in ib.positions() if p.account == TARGET_ACCOUNT}
     for symbol in tickers:
-        contract = Stock(symbol, EXCHANGE, CURRENCY)
-        print(f"\n[{datetime.now()}] Processing {symbol}")
+        if symbol in held:
+            print(f"[{datetime.now()}] Already have {symbol}, skipping buy.")
+    tickers = [t for t in tickers if t not in held]
 
-        # Request snapshot price (guaranteed delayed price)
-        ticker = ib.reqMktData(contract, snapshot=True)
-        ib.sleep(2)  # give IBKR time to populate price
+    # Request snapshot prices (guaranteed delayed price) for all symbols in one batch
+    contracts = [Stock(symbol, EXCHANGE, CURRENCY) for symbol in tickers]
+    snapshots = request_snapshots(ib, contracts)
 
-        price = None
-        if getattr(ticker, 'last', None) and not math.isnan(ticker.last):
-            price = ticker.last
-        elif getattr(ticker, 'close', None) and not math.isnan(ticker.close):
-            price = ticker.close
+    buys = []
+    for symbol, contract, ticker in zip(tickers, contracts, snapshots):
+        print(f"\n[{datetime.now()}] Processing {symbol}")
+
+        price = pick_price(ticker)
 
         if not price:
             print(f"[{datetime.now()}] No valid price for {symbol} — skipping")
@@ -72,14 +83,17 @@ def main():
             print(f"[{datetime.now()}] Qty computed as 0 for {symbol} (@{price}) — skipping")
             continue
 
-        # Place market BUY order
+        # Place market BUY order (non-blocking; fills are awaited together below)
         order = MarketOrder('BUY', qty)
         trade = ib.placeOrder(contract, order)
         print(f"[{datetime.now()}] BUY MARKET {symbol} x {qty} @ {price}")
+        buys.append((symbol, contract, qty, price, trade))
+
+    # Wait until every buy is done
+    while any(not trade.isDone() for *_, trade in buys):
+        ib.waitOnUpdate(timeout=1)
 
-        # Wait until filled
-        while not trade.isDone():
-            ib.sleep(1)
+    for symbol, contract, qty, price, trade in buys:
         print(f"[{datetime.now()}] Buy filled for {symbol}")
 
         # Place TP/SL using LIMIT SELL orders
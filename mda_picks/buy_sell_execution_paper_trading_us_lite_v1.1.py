@@ -1,12 +1,22 @@
-import time
+import sys
+import threading
 import math
 import asyncio
-from datetime import datetime
+from datetime import datetime, timedelta
+from pathlib import Path
 import pytz
 import gspread
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.executors.pool import ThreadPoolExecutor
 from ib_insync import IB, Stock, MarketOrder, LimitOrder, StopOrder
 
+# --- PATH SETUP ---
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
+from utils.utils_ibkr_portfolio import pick_price, request_snapshots
+
 # -------------------------
 # CONFIG
 HOST = '127.0.0.1'
@@ -15,7 +25,6 @@ CLIENT_ID = 2
 TARGET_ACCOUNT = 'DUO713598'
 TIMEZONE = 'US/Eastern'
 FIXED_TRADE_AMOUNT = 25000  # $25k per ticker
-SLEEP_INTERVAL = 1  # seconds
 SPREADSHEET_ID = '1gEHjNEI-0Zr-_cMzHsOnEurcA0q2rGtdDgEyRKFgY38'
 TAB_NAME = 'selected_MDA'
 GSHEETS_CREDS = 'service_account_key.json'
@@ -25,6 +34,9 @@ DAILY_BUY_START = (14, 29)  # 2:00 PM EST
 DAILY_BUY_END = (14, 30)    # 2:05 PM EST
 # -------------------------
 
+ib = IB()
+_POTD_WORKSHEET = None
+
 def ensure_event_loop():
     """Ensure an asyncio event loop exists in current thread."""
     try:
@@ -37,11 +49,18 @@ def ensure_event_loop():
         asyncio.set_event_loop(loop)
     return loop
 
+def get_potd_worksheet():
+    """Open the POTD worksheet once and reuse it across scheduler fires."""
+    global _POTD_WORKSHEET
+    if _POTD_WORKSHEET is None:
+        gc = gspread.service_account(filename=GSHEETS_CREDS)
+        sh = gc.open_by_key(SPREADSHEET_ID)
+        _POTD_WORKSHEET = sh.worksheet(TAB_NAME)
+    return _POTD_WORKSHEET
+
 def get_potd_from_gsheet():
     """Fetch tickers from Google Sheets (first column)."""
-    gc = gspread.service_account(filename=GSHEETS_CREDS)
-    sh = gc.open_by_key(SPREADSHEET_ID)
-    ws = sh.worksheet(TAB_NAME)
+    ws = get_potd_worksheet()
     data = ws.col_values(1)
     potd = [d.strip() for d in data if d.strip()]
     print(f"[{datetime.now()}] POTD: {potd}")
@@ -52,31 +71,28 @@ def execute_daily_buys():
 
     tz = pytz.timezone(TIMEZONE)
     now = datetime.now(tz)
-    start_h, start_m = DAILY_BUY_START
-    end_h, end_m = DAILY_BUY_END
+    start_dt = tz.localize(datetime(now.year, now.month, now.day, *DAILY_BUY_START))
+    end_dt = tz.localize(datetime(now.year, now.month, now.day, *DAILY_BUY_END)) + timedelta(minutes=1)  # end minute inclusive
 
     # Only run during buy window
-    if not ((now.hour > start_h or (now.hour == start_h and now.minute >= start_m)) and
-            (now.hour < end_h or (now.hour == end_h and now.minute <= end_m))):
+    if not start_dt <= now < end_dt:
         print(f"[{datetime.now()}] Not in buy window. Exiting.")
         return
 
-    ib = IB()
-    ib.connect(HOST, PORT, clientId=CLIENT_ID, timeout=5)
-    ib.reqMarketDataType(3)  # delayed prices
+    # Reuse the session across scheduler fires (all run on the scheduler's single worker
+    # thread, which owns the connection's event loop); reconnect only if it dropped
+    if not ib.isConnected():
+        ib.connect(HOST, PORT, clientId=CLIENT_ID, timeout=5)
+        ib.reqMarketDataType(3)  # delayed prices
 
     tickers = get_potd_from_gsheet()
 
-    for symbol in tickers:
-        contract = Stock(symbol, 'SMART', 'USD')
-        ticker = ib.reqMktData(contract, snapshot=True)
-        ib.sleep(2)  # wait for snapshot
+    contracts = [Stock(symbol, 'SMART', 'USD') for symbol in tickers]
+    snapshots = request_snapshots(ib, contracts)  # one wait for all symbols
 
-        price = None
-        if ticker.last and not math.isnan(ticker.last):
-            price = ticker.last
-        elif ticker.close and not math.isnan(ticker.close):
-            price = ticker.close
+    buys = []
+    for symbol, contract, ticker in zip(tickers, contracts, snapshots):
+        price = pick_price(ticker)
 
         if not price:
             print(f"[{datetime.now()}] No valid market price for {symbol} — skipping.")
@@ -91,8 +107,10 @@ def execute_daily_buys():
         order = MarketOrder('BUY', qty)
         ib.placeOrder(contract, order)
         print(f"[{datetime.now()}] Market BUY placed for {symbol} qty={qty} @ {price}")
+        buys.append((symbol, contract, qty, price))
 
-        # Place TP/SL immediately (Day 1)
+    # All buys are in flight; now place TP/SL for each (Day 1)
+    for symbol, contract, qty, price in buys:
         tp_price = round(price * TP_MULT, 2)
         sl_price = round(price * SL_MULT, 2)
 
@@ -105,22 +123,21 @@ def execute_daily_buys():
         ib.placeOrder(contract, sl_order)
         print(f"[{datetime.now()}] TP/SL placed for {symbol} | TP~{tp_price}, SL~{sl_price}")
 
-        time.sleep(SLEEP_INTERVAL)
-
-    ib.disconnect()
     print(f"[{datetime.now()}] Daily buy routine complete.")
 
 # -------------------------
 # Scheduler
 # -------------------------
-scheduler = BackgroundScheduler(timezone=TIMEZONE)
+# One worker thread, so every fire runs on the thread (and event loop) that owns the IB socket
+scheduler = BackgroundScheduler(timezone=TIMEZONE, executors={'default': ThreadPoolExecutor(1)})
 scheduler.add_job(execute_daily_buys, 'cron', hour=DAILY_BUY_START[0], minute=DAILY_BUY_START[1])
 scheduler.start()
 print(f"[{datetime.now()}] Scheduler started. Waiting for buy window...")
 
 try:
-    while True:
-        time.sleep(60)
+    threading.Event().wait()  # sleeps until Ctrl-C; no periodic wakeups
 except (KeyboardInterrupt, SystemExit):
     print(f"[{datetime.now()}] Shutting down scheduler...")
     scheduler.shutdown()
+    if ib.isConnected():
+        ib.disconnect()
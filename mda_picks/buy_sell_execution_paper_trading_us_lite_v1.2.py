@@ -1,6 +1,8 @@
-import time
+import sys
+import threading
 import math
 from datetime import datetime
+from pathlib import Path
 import pytz
 import gspread
 from apscheduler.schedulers.background import BackgroundScheduler
@@ -9,6 +11,13 @@ import pandas_market_calendars as mcal
 from ib_insync import IB, Stock, MarketOrder, LimitOrder, StopOrder
 import asyncio
 
+# --- PATH SETUP ---
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
+from utils.utils_ibkr_portfolio import pick_price, request_snapshots
+
 # ------------------------- CONFIG -------------------------
 HOST = '127.0.0.1'
 PORT = 7497
@@ -28,6 +37,8 @@ FIXED_TRADE_AMOUNT = 5000  # $25k per ticker
 ib = IB()
 tz = pytz.timezone(TIMEZONE)
 nyse = mcal.get_calendar('NYSE')
+_POTD_WORKSHEET = None
+_SESSIONS_CACHE = {}  # buy date -> NYSE sessions over the following 15 calendar days
 
 
 # ------------------------- Helpers -------------------------
@@ -46,11 +57,18 @@ def ensure_event_loop():
         asyncio.set_event_loop(loop)
     return loop
 
+def get_potd_worksheet():
+    """Open the POTD worksheet once and reuse it across scheduler fires."""
+    global _POTD_WORKSHEET
+    if _POTD_WORKSHEET is None:
+        gc = gspread.service_account(filename=GSHEETS_CREDS)
+        sh = gc.open_by_key(SPREADSHEET_ID)
+        _POTD_WORKSHEET = sh.worksheet(TAB_NAME)
+    return _POTD_WORKSHEET
+
 def get_potd_from_gsheet():
     """Return list of tickers from Google Sheets (first column)."""
-    gc = gspread.service_account(filename=GSHEETS_CREDS)
-    sh = gc.open_by_key(SPREADSHEET_ID)
-    ws = sh.worksheet(TAB_NAME)
+    ws = get_potd_worksheet()
     data = ws.col_values(1)
     tickers = [d.strip() for d in data if d.strip()]
     print(f"[{datetime.now()}] POTD tickers: {tickers}")
@@ -62,22 +80,24 @@ def calculate_qty(price):
     return max(qty, 1)
 
 
-def get_delayed_price(contract):
-    ib.reqMarketDataType(3)  # delayed
-    ticker = ib.reqMktData(contract, snapshot=True)
-    ib.sleep(2)
-    price = None
-    if ticker.last and not math.isnan(ticker.last):
-        price = ticker.last
-    elif ticker.close and not math.isnan(ticker.close):
-        price = ticker.close
-    return price
+def get_delayed_prices(contracts):
+    """Snapshot delayed prices for all contracts in one batch (a single wait)."""
+    tickers = request_snapshots(ib, contracts)
+    return [pick_price(ticker) for ticker in tickers]
+
+
+def sessions_from(buy_date):
+    """NYSE sessions in the 15 days from buy_date; built once per date and shared across symbols."""
+    key = buy_date.date() if isinstance(buy_date, datetime) else buy_date
+    if key not in _SESSIONS_CACHE:
+        schedule = nyse.schedule(start_date=key, end_date=key + pd.Timedelta(days=15))
+        _SESSIONS_CACHE[key] = schedule.index
+    return _SESSIONS_CACHE[key]
 
 
 def place_tp_sl_for_symbol(symbol, qty, ref_price, buy_date):
     """Place TP/SL valid for 5 trading days using NYSE calendar."""
-    schedule = nyse.schedule(start_date=buy_date, end_date=buy_date + pd.Timedelta(days=15))
-    trading_days = schedule.index
+    trading_days = sessions_from(buy_date)
     if len(trading_days) < 5:
         raise ValueError("Not enough trading days for 5-day TP/SL.")
 
@@ -105,18 +125,24 @@ def execute_daily_buys():
 
         if not ib.isConnected():
             ib.connect(HOST, PORT, clientId=CLIENT_ID, timeout=5)
+            ib.reqMarketDataType(3)  # delayed prices, once per connection
             print(f"[{datetime.now()}] Connected to IBKR")
 
         tickers = get_potd_from_gsheet()
         positions = {p.contract.symbol for p in ib.positions() if p.account == TARGET_ACCOUNT}
 
+        to_buy = []
         for symbol in tickers:
             if symbol in positions:
                 print(f"[{datetime.now()}] Already have {symbol}, skipping buy.")
                 continue
+            to_buy.append(symbol)
+
+        contracts = [Stock(symbol, 'SMART', 'USD') for symbol in to_buy]
+        prices = get_delayed_prices(contracts) if contracts else []
 
-            contract = Stock(symbol, 'SMART', 'USD')
-            price = get_delayed_price(contract)
+        buys = []
+        for symbol, contract, price in zip(to_buy, contracts, prices):
             if not price:
                 print(f"[{datetime.now()}] No valid market price for {symbol}, skipping.")
                 continue
@@ -127,12 +153,14 @@ def execute_daily_buys():
                 continue
 
             order = MarketOrder('BUY', qty)
-            trade = ib.placeOrder(contract, order)
-            ib.sleep(2)
+            ib.placeOrder(contract, order)
             print(f"[{datetime.now()}] Market BUY {symbol} qty={qty} at approx {price:.2f}")
+            buys.append((symbol, qty, price))
 
-            # TP/SL for 5 trading days
-            place_tp_sl_for_symbol(symbol, qty, price, datetime.now())
+        # All buys are in flight; now place TP/SL for 5 trading days
+        buy_date = datetime.now()
+        for symbol, qty, price in buys:
+            place_tp_sl_for_symbol(symbol, qty, price, buy_date)
 
     except Exception as e:
         print(f"[{datetime.now()}] Error in daily buys: {e}")
@@ -146,8 +174,7 @@ def main():
     print(f"[{datetime.now()}] Scheduler started. Waiting for buy window {BUY_HOUR}:{BUY_MINUTE} {TIMEZONE}.")
 
     try:
-        while True:
-            time.sleep(60)
+        threading.Event().wait()  # sleeps until Ctrl-C; no periodic wakeups
     except (KeyboardInterrupt, SystemExit):
         print(f"[{datetime.now()}] Shutting down scheduler and IBKR...")
         scheduler.shutdown()
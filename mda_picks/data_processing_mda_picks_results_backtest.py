@@ -1,17 +1,12 @@
 import sys
-import os
-import pandas as pd
-import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-# --- THIS BLOCK MUST BE BEFORE 'from utils import ...' ---
+# --- THIS BLOCK MUST RUN BEFORE 'from utils import ...' (done lazily in main) ---
 current_dir = Path(__file__).resolve().parent  # This is the 'mda_picks' folder
 project_root = current_dir.parent             # This is the 'TechnicalTrading' root
-sys.path.append(str(project_root))            # Adds root to Python's search list
-
-# Now the imports will work
-from utils import utils_gsheet_handler
-from utils import utils_tp_sl_simulation as sim
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))        # Adds root to Python's search list
 
 # ==========================================
 # CONFIGURATION
@@ -22,6 +17,7 @@ OUTPUT_TAB_NAME = "df_backtest"
 
 TRADING_DAYS = 10
 CALENDAR_DAYS = 20
+MAX_WORKERS = 5  # concurrent simulations
 
 # TP, SL, Start Day, End Day
 TP_SL_CONFIG = [
@@ -32,32 +28,33 @@ TP_SL_CONFIG = [
 
 
 def main():
+    # Heavy imports (pandas, gspread, Polygon/TA-Lib utils) are only paid when the pipeline runs
+    import pandas as pd
+    from utils import utils_gsheet_handler
+    from utils import utils_tp_sl_simulation as sim
+
     print("--- Starting Backtest Simulation ---")
     creds = project_root / 'creds' / 'service_account_key.json'
     client = utils_gsheet_handler.authenticate_gsheet(str(creds))
     if not client: return
 
     # --- PART 1: PRE-PROCESS ---
-    df_raw = utils_gsheet_handler.extract_data(client, SPREADSHEET_ID, INPUT_TAB_NAME)
+    df_raw = utils_gsheet_handler.extract_data(client, SPREADSHEET_ID, INPUT_TAB_NAME,
+                                               numeric_cols=['is_positive_mg', 'is_processed', 'mcap', 'price'])
     if df_raw is None or df_raw.empty: return
 
-    # 1. Filter and dedupe
-    df = df_raw[
-        (df_raw['is_positive_mg'] == 1) & (df_raw['mcap'] >= 500) &
-        ((df_raw['is_processed'] != 1) | (df_raw['is_processed'].isna()) | (df_raw['is_processed'] == ""))
-        ].copy()
+    # 1. Filter (unprocessed = anything not equal to 1, including blank/NaN)
+    subset_cols = ['date', 'ticker', 'sector', 'price', 'mcap', 'is_positive_mg']
+    mask = df_raw['is_positive_mg'].eq(1) & (df_raw['mcap'] >= 500) & ~df_raw['is_processed'].eq(1)
+    df = df_raw.loc[mask, subset_cols]
 
     # 2. Define the columns you want to deduplicate by (the "keys")
     dedupe_keys = ['date', 'ticker', 'sector', 'is_positive_mg']
 
     # 3. Use groupby to find the maximum for mcap and price within those groups
-    df = df.groupby(dedupe_keys, as_index=False).agg({
-        'mcap': 'max',
-        'price': 'max'
-    })
+    df = df.groupby(dedupe_keys, as_index=False, sort=False)[['mcap', 'price']].max()
 
-    # Optional: Reorder columns to match your original subset_cols if needed
-    subset_cols = ['date', 'ticker', 'sector', 'price', 'mcap', 'is_positive_mg']
+    # Reorder columns to match subset_cols
     df = df[subset_cols].reset_index(drop=True)
 
     if df.empty:
@@ -68,25 +65,30 @@ def main():
     final_results = []
     print(f"Processing {len(df)} unique ticker-date combinations...")
 
-    for idx, row in df.iterrows():
-        print(f"[{idx + 1}/{len(df)}] Simulating {row['ticker']}...")
-
-        outcome = sim.run_simulation(
-            ticker=row['ticker'],
-            pick_date=row['date'],
-            calendar_days=CALENDAR_DAYS,
-            tp_sl_list=TP_SL_CONFIG,
-            trading_days_limit=TRADING_DAYS
-        )
-
-        if not outcome.get("error"):
-            # Combine original data with outcome results
-            final_results.append({**row.to_dict(), **outcome})
-            print(f"  -> {outcome['trigger']} Success.")
-        else:
-            print(f"  -> Error: {outcome['error']}")
-
-        time.sleep(12)  # API Limit protection
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = [
+            (row, ex.submit(
+                sim.run_simulation,
+                ticker=row.ticker,
+                pick_date=row.date,
+                calendar_days=CALENDAR_DAYS,
+                tp_sl_list=TP_SL_CONFIG,
+                trading_days_limit=TRADING_DAYS
+            ))
+            for row in df.itertuples(index=False)
+        ]
+
+        # Collect in submission order so the export keeps the input ordering
+        for idx, (row, future) in enumerate(futures):
+            outcome = future.result()
+            print(f"[{idx + 1}/{len(df)}] Simulated {row.ticker}")
+
+            if not outcome.get("error"):
+                # Combine original data with outcome results
+                final_results.append({**row._asdict(), **outcome})
+                print(f"  -> {outcome['trigger']} Success.")
+            else:
+                print(f"  -> Error: {outcome['error']}")
 
     # --- PART 4: EXPORT ---
     if final_results:
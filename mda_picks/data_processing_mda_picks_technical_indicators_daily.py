@@ -1,17 +1,12 @@
-import os
 import sys
-import time
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # --- PATH SETUP ---
 current_dir = Path(__file__).resolve().parent
 project_root = current_dir.parent
-sys.path.append(str(project_root))
-
-# Import your modules
-from utils import utils_gsheet_handler
-from utils import utils_technical_indicators
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
 
 # ==========================================
 # USER CONFIGURATION
@@ -25,6 +20,7 @@ LOOKBACK = 365
 MULTIPLIER = 1
 TIMESPAN = "day"
 WINDOW = 10
+MAX_WORKERS = 5  # concurrent tickers
 
 CREDS_FILE_PATH = project_root / 'creds' / 'service_account_key.json'
 
@@ -33,21 +29,25 @@ CREDS_FILE_PATH = project_root / 'creds' / 'service_account_key.json'
 # EXECUTION
 # ==========================================
 def main():
+    # Import your modules (deferred so importing this file stays cheap)
+    from utils import utils_gsheet_handler
+    from utils import utils_technical_indicators
+
     print(f"--- Starting Daily Pipeline ---")
 
     # 1. Authenticate and Extract Data
     client = utils_gsheet_handler.authenticate_gsheet(str(CREDS_FILE_PATH))
     if not client: return
 
-    df_full = utils_gsheet_handler.extract_data(client, SPREADSHEET_ID, INPUT_TAB_NAME)
+    df_full = utils_gsheet_handler.extract_data(client, SPREADSHEET_ID, INPUT_TAB_NAME,
+                                                numeric_cols=['is_positive_mg', 'is_processed'])
     if df_full is None or df_full.empty:
         print("No data found.")
         return
 
     # --- FILTER FOR UNPROCESSED ROWS ---
-    # Filters rows where 'is_processed' is empty, null, or 0
-    df = df_full[ (df_full['is_positive_mg'] == 1) &
-                  (df_full['is_processed'].isna() | (df_full['is_processed'] == "") | (df_full['is_processed'] == 0))].copy()
+    # Filters rows where 'is_processed' is empty, null, or 0 (blanks are already NaN)
+    df = df_full[df_full['is_positive_mg'].eq(1) & df_full['is_processed'].fillna(0).eq(0)].copy()
 
     if df.empty:
         print("All rows are already processed. Exiting.")
@@ -56,39 +56,49 @@ def main():
     # 2. Processing Loop
     print(f"Processing {len(df)} unprocessed tickers...")
 
-    for index, row in df.iterrows():
-        ticker = row.get("ticker")
-        date = row.get("date")
-
-        if not ticker or not date:
-            continue
-
-        print(f"[{index + 1}] Processing {ticker}...", end=" ")
-
-        # --- THE FIX: CALLING THE TECHNICAL INDICATORS FILE ---
-        # This calls the orchestrator function in utils_technical_indicators.py
-        results = utils_technical_indicators.process_technical_indicators(
-            ticker=ticker,
-            end_date=date,
-            lookback=LOOKBACK,
-            multiplier=MULTIPLIER,
-            timespan=TIMESPAN,
-            window=WINDOW
-        )
-
-        if results:
-            # Map results (e.g. rsi_30_crossover_period) to the DataFrame
-            for key, value in results.items():
-                df.at[index, key] = value
-
-            # Update status
-            df.at[index, 'is_processed'] = 1
-            print("Done.")
-        else:
-            print("Failed.")
-
-        # --- API LIMIT PROTECTION ---
-        time.sleep(12)
+    # Column -> per-row values, written back with a single assign() after the loop
+    updates = {}
+
+    def set_value(pos, key, value):
+        if key not in updates:
+            updates[key] = df[key].tolist() if key in df.columns else [None] * len(df)
+        updates[key][pos] = value
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = []
+        rows = zip(df.index, df["ticker"].to_numpy(), df["date"].to_numpy())
+        for pos, (index, ticker, date) in enumerate(rows):
+            if not ticker or not date:
+                continue
+
+            # This calls the orchestrator function in utils_technical_indicators.py
+            futures.append((pos, index, ticker, ex.submit(
+                utils_technical_indicators.process_technical_indicators,
+                ticker=ticker,
+                end_date=date,
+                lookback=LOOKBACK,
+                multiplier=MULTIPLIER,
+                timespan=TIMESPAN,
+                window=WINDOW
+            )))
+
+        # Collect in submission order so the rows are updated deterministically
+        for pos, index, ticker, future in futures:
+            results = future.result()
+            print(f"[{index + 1}] Processing {ticker}...", end=" ")
+
+            if results:
+                # Map results (e.g. rsi_30_crossover_period) to the DataFrame
+                for key, value in results.items():
+                    set_value(pos, key, value)
+
+                # Update status
+                set_value(pos, 'is_processed', 1)
+                print("Done.")
+            else:
+                print("Failed.")
+
+    df = df.assign(**updates)
 
     # 3. Export Results
     # Note: We export 'df' (the processed subset). 
@@ -9,7 +9,15 @@ This script connects to a running TWS or IB Gateway session and fetches:
 You can specify which account to target if your login has multiple accounts.
 """
 
-from ib_insync import IB
+import sys
+from pathlib import Path
+
+# --- PATH SETUP ---
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
+from utils.utils_ibkr_portfolio import ibkr_session, pick_price, request_snapshots
 
 # =========================
 # CONFIGURATION PARAMETERS
@@ -18,21 +26,14 @@ HOST = '127.0.0.1'          # TWS/IB Gateway host (usually localhost)
 PORT = 7496                 # Port for Paper (7497) or Live (7496)
 CLIENT_ID = 9               # Unique client ID for this script
 TARGET_ACCOUNT = 'U13868670' # Your IBKR account number to target
+SNAPSHOT_WAIT = 2           # Max seconds to wait for all position snapshots
 # =========================
 
-def main():
-    # Connect to IBKR
-    ib = IB()
-    try:
-        ib.connect(HOST, PORT, clientId=CLIENT_ID, timeout=5)
-        print(f"Connected to IBKR TWS/IB Gateway. Client ID: {CLIENT_ID}\n")
-    except Exception as e:
-        print(f"Error connecting to IBKR: {e}")
-        return
-
+def report_portfolio(ib, account=TARGET_ACCOUNT):
+    """Prints the account summary and positions using an already-connected IB instance."""
     # Fetch account summary for target account
     try:
-        account_summary = ib.accountSummary(account=TARGET_ACCOUNT)
+        account_summary = ib.accountSummary(account=account)
         print("=== Account Summary ===")
         for item in account_summary:
             if item.tag in ['NetLiquidation', 'TotalCashValue']:
@@ -43,20 +44,31 @@ def main():
     # Fetch positions and filter for target account
     try:
         positions = ib.positions()
-        filtered_positions = [p for p in positions if p.account == TARGET_ACCOUNT]
+        filtered_positions = [p for p in positions if p.account == account]
         print("\n=== Positions ===")
         if not filtered_positions:
             print("No positions in this account.")
-        for pos in filtered_positions:
-            market_price = pos.marketPrice if pos.marketPrice is not None else 0
+
+        # Request every snapshot at once and wait for them together, not per symbol
+        contracts = [p.contract for p in filtered_positions]
+        tickers = request_snapshots(ib, contracts, wait=SNAPSHOT_WAIT) if contracts else []
+
+        for pos, ticker in zip(filtered_positions, tickers):
+            market_price = pick_price(ticker) or 0
             value = market_price * pos.position
             print(f"{pos.contract.symbol}: {pos.position} shares, value={value:.2f} {pos.contract.currency}")
     except Exception as e:
         print(f"Error fetching positions: {e}")
 
-    # Disconnect
-    ib.disconnect()
-    print("\nDisconnected from IBKR")
+
+def main():
+    # Connect to IBKR (disconnects automatically on exit)
+    try:
+        with ibkr_session(HOST, PORT, CLIENT_ID) as ib:
+            print()
+            report_portfolio(ib, TARGET_ACCOUNT)
+    except ConnectionError as e:
+        print(f"Error connecting to IBKR: {e}")
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,14 @@
-import time
+import sys
 import math
-from ib_insync import IB, Stock
+from pathlib import Path
+from ib_insync import Stock
+
+# --- PATH SETUP ---
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
+from utils.utils_ibkr_portfolio import ibkr_session
 
 # -------------------------
 # CONFIG
@@ -12,34 +20,37 @@ EXCHANGE = 'SMART'
 CURRENCY = 'USD'
 # -------------------------
 
-ib = IB()
-ib.connect(HOST, PORT, clientId=CLIENT_ID, timeout=5)
-print("Connected to IBKR")
 
-# 🔥 Force delayed data mode
-ib.reqMarketDataType(3)
+def check_delayed_price(ib, symbol=SYMBOL):
+    """Requests one delayed snapshot on an already-connected IB instance and prints the price."""
+    # 🔥 Force delayed data mode
+    ib.reqMarketDataType(3)
 
-contract = Stock(SYMBOL, EXCHANGE, CURRENCY)
-print(f"{contract}")
-# -------------------------
-# 🔥 Snapshot request — guaranteed to return delayed price
-# -------------------------
-ticker = ib.reqMktData(contract, snapshot=True)
-print(f"{ticker}")
-ib.sleep(2)
+    contract = Stock(symbol, EXCHANGE, CURRENCY)
+    print(f"{contract}")
+    # -------------------------
+    # 🔥 Snapshot request — guaranteed to return delayed price
+    # -------------------------
+    ticker = ib.reqMktData(contract, snapshot=True)
+    print(f"{ticker}")
+    ib.sleep(2)
+
+    # IBKR puts delayed price into ticker.last or ticker.close
+    price = None
+
+    if ticker.last and not math.isnan(ticker.last):
+        price = ticker.last
+    elif ticker.close and not math.isnan(ticker.close):
+        price = ticker.close
 
-# IBKR puts delayed price into ticker.last or ticker.close
-price = None
+    if price:
+        print(f"Delayed price for {symbol}: {price}")
+    else:
+        print("Still no price — your region might require ‘US Equity and Options Add-On’ market data (free).")
 
-if ticker.last and not math.isnan(ticker.last):
-    price = ticker.last
-elif ticker.close and not math.isnan(ticker.close):
-    price = ticker.close
+    print("Ticker:", ticker)
 
-if price:
-    print(f"Delayed price for {SYMBOL}: {price}")
-else:
-    print("Still no price — your region might require ‘US Equity and Options Add-On’ market data (free).")
 
-print("Ticker:", ticker)
-ib.disconnect()
+if __name__ == "__main__":
+    with ibkr_session(HOST, PORT, CLIENT_ID) as ib:
+        check_delayed_price(ib)
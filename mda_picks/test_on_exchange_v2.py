@@ -1,6 +1,13 @@
-import time
-import math
-from ib_insync import IB, Stock
+import sys
+from pathlib import Path
+from ib_insync import Stock
+
+# --- PATH SETUP ---
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
+from utils.utils_ibkr_portfolio import ibkr_session, pick_price, request_snapshots
 
 # -------------------------
 # CONFIG
@@ -10,35 +17,32 @@ CLIENT_ID = 2
 TICKERS = ['AAPL', 'MSFT', 'GOOG', 'AMZN', 'TSLA']  # list of tickers
 EXCHANGE = 'SMART'
 CURRENCY = 'USD'
+WAIT_SECONDS = 3  # overall deadline for all snapshots
 # -------------------------
 
-ib = IB()
-ib.connect(HOST, PORT, clientId=CLIENT_ID, timeout=5)
-print("Connected to IBKR")
 
-# 🔥 Force delayed data mode
-ib.reqMarketDataType(3)
+def check_delayed_prices(ib, symbols=TICKERS):
+    """Requests delayed snapshots for all symbols on an already-connected IB instance and prints them."""
+    # 🔥 Force delayed data mode
+    ib.reqMarketDataType(3)
+
+    contracts = [Stock(symbol, EXCHANGE, CURRENCY) for symbol in symbols]
 
-for SYMBOL in TICKERS:
-    contract = Stock(SYMBOL, EXCHANGE, CURRENCY)
-    print(f"\nRequesting price for {SYMBOL}: {contract}")
+    # 🔥 Snapshot requests — fired together, one wait (up to WAIT_SECONDS) for all of them
+    tickers = request_snapshots(ib, contracts, wait=WAIT_SECONDS)
 
-    # 🔥 Snapshot request — guaranteed to return delayed price
-    ticker = ib.reqMktData(contract, snapshot=True)
-    ib.sleep(2)  # allow IBKR to populate delayed data
+    for symbol, ticker in zip(symbols, tickers):
+        print(f"\nPrice for {symbol}: {ticker.contract}")
+        price = pick_price(ticker)
 
-    price = None
-    if getattr(ticker, 'last', None) and not math.isnan(ticker.last):
-        price = ticker.last
-    elif getattr(ticker, 'close', None) and not math.isnan(ticker.close):
-        price = ticker.close
+        if price:
+            print(f"Delayed price for {symbol}: {price}")
+        else:
+            print(f"Still no price for {symbol} — check market data subscription.")
 
-    if price:
-        print(f"Delayed price for {SYMBOL}: {price}")
-    else:
-        print(f"Still no price for {SYMBOL} — check market data subscription.")
+        print("Ticker object:", ticker)
 
-    print("Ticker object:", ticker)
 
-ib.disconnect()
-print("Disconnected")
+if __name__ == "__main__":
+    with ibkr_session(HOST, PORT, CLIENT_ID) as ib:
+        check_delayed_prices(ib)
@@ -1,10 +1,10 @@
 import os
 import sys
-import time
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timedelta
 
@@ -32,6 +32,7 @@ TIMESPAN = "day"
 TARGET_CATEGORIES = ["General ETF", "Sector ETF", "Sub-sector ETF", 
                     "Technology ETF","Healthcare ETF","Finance ETF","Materials ETF","Commodities"]
 REF_DAYS = [5, 10, 20, 40, 65]
+MAX_WORKERS = 5  # concurrent fetches
 
 
 # ==========================================
@@ -43,34 +44,32 @@ def calculate_aligned_returns(df_ohlc, ticker, category, ref_days):
     Ensures returns start at 0% at the Reference Day and only
     show the path from Ref Day (X) to Today (0).
     """
-    # Head(70) to ensure we have enough for a 65-day lookback
-    df = df_ohlc.sort_values("t", ascending=False).head(100).copy()
-    df['day_seq'] = range(len(df))  # 0 is today, 10 is 10 days ago
+    # Head(100) to ensure we have enough for a 65-day lookback; index 0 is today
+    close = df_ohlc.sort_values("t", ascending=False).head(100)['close'].to_numpy(dtype=float)
 
-    results = []
+    ref_arr, seq_arr, price_arr, pct_arr = [], [], [], []
     for ref_val in ref_days:
-        if ref_val >= len(df):
+        if ref_val >= len(close):
             continue
 
-        # The price at the reference day (e.g., 10 days ago)
-        ref_price = df.iloc[ref_val]['close']
+        # Only take days from ref_val down to 0 (today), relative to the price on the reference day
+        path = close[:ref_val + 1]
+        ref_arr.append(np.full(ref_val + 1, ref_val))
+        seq_arr.append(np.arange(ref_val + 1))
+        price_arr.append(path)
+        pct_arr.append(path / close[ref_val] - 1)
 
-        # Only take days from ref_val down to 0 (today)
-        path_df = df[df['day_seq'] <= ref_val].copy()
+    if not ref_arr:
+        return pd.DataFrame()
 
-        for _, row in path_df.iterrows():
-            pct_diff = (row['close'] / ref_price) - 1
-            results.append({
-                'ticker': ticker,
-                'price': round(row['close'], 2),
-                'category': category,
-                'ref_day': ref_val,
-                'day_seq': row['day_seq'],
-                'pct_diff': pct_diff
-            })
-
-
-    return results
+    return pd.DataFrame({
+        'ticker': ticker,
+        'price': np.round(np.concatenate(price_arr), 2),
+        'category': category,
+        'ref_day': np.concatenate(ref_arr),
+        'day_seq': np.concatenate(seq_arr),
+        'pct_diff': np.concatenate(pct_arr)
+    })
 
 
 # ==========================================
@@ -98,6 +97,19 @@ def generate_visual_report(df_all):
         'Commodities': ", ".join(sorted(df_all[df_all['category'] == 'Commodities']['ticker'].unique()))
     }
     
+    # 2. Sort once and split into per-trace arrays (newest day last, so lines run left to right)
+    df_all = df_all.sort_values(['ref_day', 'category', 'ticker', 'day_seq'], ascending=[True, True, True, False])
+    traces = {
+        key: (grp['day_seq'].to_numpy(), grp['pct_diff'].to_numpy())
+        for key, grp in df_all.groupby(['ref_day', 'category', 'ticker'], sort=False)
+    }
+    section_tickers = {}
+    for rd, cat, tkr in traces:
+        section_tickers.setdefault((rd, cat), []).append(tkr)
+
+    # Shared template: the ticker comes from the trace name, so it's built once, not per trace
+    hover = "<b>%{fullData.name}</b><br>Day: %{x}<br>Return: %{y:.2%}<extra></extra>"
+
     sections_html = ""
     for rd in ref_days:
         for cat in categories:
@@ -110,24 +122,22 @@ def generate_visual_report(df_all):
                              .replace("Materials ETF", "Materials ETFs")\
                              .replace("Commodities", "Commodities ETFs")
             
-            mask = (df_all['ref_day'] == rd) & (df_all['category'] == cat)
-            sub_df = df_all[mask]
-            tickers = sorted(sub_df['ticker'].unique())
-
             fig = go.Figure()
             latest_stats = []
 
-            for tkr in tickers:
-                tkr_df = sub_df[sub_df['ticker'] == tkr].sort_values('day_seq', ascending=False)
-                perf_val = tkr_df[tkr_df['day_seq'] == 0]['pct_diff'].values[0] if not tkr_df.empty else 0
+            for tkr in section_tickers.get((rd, cat), []):
+                day_seq, pct_diff = traces[(rd, cat, tkr)]
+                today_pct = pct_diff[day_seq == 0]
+                perf_val = today_pct[0] if len(today_pct) else 0
                 latest_stats.append({'Ticker': tkr, 'Perf': f"{perf_val:+.2%}"})
 
+                # Hover shows at most 0.01%, so 4 decimals loses nothing
                 fig.add_trace(go.Scatter(
-                    x=tkr_df['day_seq'], y=tkr_df['pct_diff'],
+                    x=day_seq, y=np.round(pct_diff, 4),
                     mode='lines', name=tkr,
                     line=dict(width=2, color=color_map[tkr]),
                     showlegend=False,
-                    hovertemplate=f"<b>{tkr}</b><br>Day: %{{x}}<br>Return: %{{y:.2%}}<extra></extra>"
+                    hovertemplate=hover
                 ))
 
             # Applied requested wide dimensions
@@ -224,26 +234,34 @@ def main():
     if df_raw is None or df_raw.empty: return
 
     df_filtered = df_raw[df_raw['category'].isin(TARGET_CATEGORIES)].copy()
-    all_results = []
+    frames = []
     today = pd.Timestamp.now().strftime('%Y-%m-%d')
 
     print(f"Analyzing {len(df_filtered)} tickers...")
-    for idx, row in df_filtered.iterrows():
-        ticker, cat = row['ticker'], row['category']
-        print(f"[{idx + 1}] {ticker}...", end=" ")
-
-        df_ohlc = utils_technical_indicators.get_ohlc_data(ticker, today, LOOKBACK, MULTIPLIER, TIMESPAN)
-
-        if df_ohlc is not None and not df_ohlc.empty:
-            data = calculate_aligned_returns(df_ohlc, ticker, cat, REF_DAYS)
-            all_results.extend(data)
-            print("Done.")
-        else:
-            print("Failed.")
-        time.sleep(12)
-
-    if all_results:
-        generate_visual_report(pd.DataFrame(all_results))
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = [
+            (idx, ticker, cat, ex.submit(utils_technical_indicators.get_ohlc_data,
+                                         ticker, today, LOOKBACK, MULTIPLIER, TIMESPAN))
+            for idx, ticker, cat in zip(df_filtered.index,
+                                        df_filtered['ticker'].to_numpy(),
+                                        df_filtered['category'].to_numpy())
+        ]
+
+        # Collect in submission order so the report keeps the shortlist ordering
+        for idx, ticker, cat, future in futures:
+            df_ohlc = future.result()
+            print(f"[{idx + 1}] {ticker}...", end=" ")
+
+            if df_ohlc is not None and not df_ohlc.empty:
+                data = calculate_aligned_returns(df_ohlc, ticker, cat, REF_DAYS)
+                if not data.empty:
+                    frames.append(data)
+                print("Done.")
+            else:
+                print("Failed.")
+
+    if frames:
+        generate_visual_report(pd.concat(frames, ignore_index=True))
 
 
 if __name__ == "__main__":
@@ -1,10 +1,10 @@
 import os
 import sys
-import time
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timedelta
 
@@ -33,6 +33,7 @@ TARGET_CATEGORIES = ["Semicon", "Software", "Comm Svc", "Healthcare", "Finance",
                     "Consumer Discretionary", "Alternative Energy & Industrials", "Alternative Investments"]
 
 REF_DAYS = [5, 10, 20, 40, 65]
+MAX_WORKERS = 5  # concurrent fetches
 
 
 # ==========================================
@@ -40,25 +41,24 @@ REF_DAYS = [5, 10, 20, 40, 65]
 # ==========================================
 
 def calculate_aligned_returns(df_ohlc, ticker, category, is_etf, ref_days):
-    df = df_ohlc.sort_values("t", ascending=False).head(100).copy()
-    df['day_seq'] = range(len(df))
+    close = df_ohlc.sort_values("t", ascending=False).head(100)['close'].to_numpy(dtype=float)
 
-    results = []
+    ref_arr, seq_arr, pct_arr = [], [], []
     for ref_val in ref_days:
-        if ref_val >= len(df): continue
-        ref_price = df.iloc[ref_val]['close']
-        path_df = df[df['day_seq'] <= ref_val].copy()
-
-        for _, row in path_df.iterrows():
-            results.append({
-                'ticker': ticker,
-                'category': category,
-                'is_etf': is_etf,
-                'ref_day': ref_val,
-                'day_seq': row['day_seq'],
-                'pct_diff': (row['close'] / ref_price) - 1
-            })
-    return results
+        if ref_val >= len(close): continue
+        ref_arr.append(np.full(ref_val + 1, ref_val))
+        seq_arr.append(np.arange(ref_val + 1))
+        pct_arr.append(close[:ref_val + 1] / close[ref_val] - 1)
+
+    if not ref_arr: return pd.DataFrame()
+    return pd.DataFrame({
+        'ticker': ticker,
+        'category': category,
+        'is_etf': is_etf,
+        'ref_day': np.concatenate(ref_arr),
+        'day_seq': np.concatenate(seq_arr),
+        'pct_diff': np.concatenate(pct_arr)
+    })
 
 
 # ==========================================
@@ -99,8 +99,10 @@ def generate_visual_report(df_all):
 
             for tkr in tickers:
                 tkr_df = sub_df[sub_df['ticker'] == tkr].sort_values('day_seq', ascending=False)
-                is_etf_flag = tkr_df['is_etf'].iloc[0]
-                perf_val = tkr_df[tkr_df['day_seq'] == 0]['pct_diff'].values[0] if not tkr_df.empty else 0
+                day_seq, pct_diff = tkr_df['day_seq'].to_numpy(), tkr_df['pct_diff'].to_numpy()
+                is_etf_flag = tkr_df['is_etf'].iat[0]
+                today_pct = pct_diff[day_seq == 0]
+                perf_val = today_pct[0] if len(today_pct) else 0
                 latest_stats.append({'Ticker': tkr, 'Perf': f"{perf_val:+.2%}"})
 
                 # Formatting: Black for ETFs, Color for stocks
@@ -108,7 +110,7 @@ def generate_visual_report(df_all):
                 line_width = 3 if is_etf_flag == 1 else 2
 
                 fig.add_trace(go.Scatter(
-                    x=tkr_df['day_seq'], y=tkr_df['pct_diff'],
+                    x=day_seq, y=np.round(pct_diff, 4),
                     mode='lines', name=tkr,
                     line=dict(width=line_width, color=line_color),
                     showlegend=False,
@@ -197,16 +199,23 @@ def main():
     # Standardize is_etf column (handle strings vs numbers)
     df_raw['is_etf'] = pd.to_numeric(df_raw['is_etf'], errors='coerce').fillna(0)
     df_filtered = df_raw[df_raw['category'].isin(TARGET_CATEGORIES)].copy()
-    all_results = []
+    frames = []
     today = pd.Timestamp.now().strftime('%Y-%m-%d')
 
-    for idx, row in df_filtered.iterrows():
-        ticker, cat, is_etf = row['ticker'], row['category'], row['is_etf']
-        df_ohlc = utils_technical_indicators.get_ohlc_data(ticker, today, LOOKBACK, MULTIPLIER, TIMESPAN)
-        if df_ohlc is not None and not df_ohlc.empty:
-            all_results.extend(calculate_aligned_returns(df_ohlc, ticker, cat, is_etf, REF_DAYS))
-        time.sleep(12)
-
-    if all_results: generate_visual_report(pd.DataFrame(all_results))
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = [
+            (ticker, cat, is_etf, ex.submit(utils_technical_indicators.get_ohlc_data,
+                                            ticker, today, LOOKBACK, MULTIPLIER, TIMESPAN))
+            for ticker, cat, is_etf in zip(df_filtered['ticker'].to_numpy(),
+                                           df_filtered['category'].to_numpy(),
+                                           df_filtered['is_etf'].to_numpy())
+        ]
+        for ticker, cat, is_etf, future in futures:
+            df_ohlc = future.result()
+            if df_ohlc is not None and not df_ohlc.empty:
+                data = calculate_aligned_returns(df_ohlc, ticker, cat, is_etf, REF_DAYS)
+                if not data.empty: frames.append(data)
+
+    if frames: generate_visual_report(pd.concat(frames, ignore_index=True))
 
 if __name__ == "__main__": main()
\ No newline at end of file
@@ -1,6 +1,5 @@
 import os
 import sys
-import time
 import pandas as pd
 from pathlib import Path
 
@@ -26,6 +25,7 @@ LOOKBACK = 365 #need at least 250 due to EMA-150 calculations
 MULTIPLIER = 1
 TIMESPAN = "day"
 WINDOW = 10
+MAX_WORKERS = 5  # concurrent tickers
 #DATE = '2025-12-22'
 # Gets current date, subtracts 1 day, and formats as 'YYYY-MM-DD'
 DATE = (pd.Timestamp.now() - pd.Timedelta(days=1)).strftime('%Y-%m-%d')
@@ -55,40 +55,52 @@ def main():
     # 2. Processing Loop
     print(f"Processing {len(df)} tickers...")
 
-    for index, row in df.iterrows():
-        ticker = row.get("ticker")
-        date = row.get("date")
-
-        if not ticker or not date:
+    # Column -> per-row values, written back with a single assign() after the loop
+    updates = {}
+
+    def set_value(pos, key, value):
+        if key not in updates:
+            updates[key] = df[key].tolist() if key in df.columns else [None] * len(df)
+        updates[key][pos] = value
+
+    # Every row shares DATE, so fetch each ticker once, concurrently; Polygon's rate
+    # limit is enforced inside get_ohlc_data
+    results_by_ticker = utils_technical_indicators.process_many(
+        [ticker for ticker in df["ticker"].to_numpy() if ticker],
+        max_workers=MAX_WORKERS,
+        end_date=DATE,
+        lookback=LOOKBACK,
+        multiplier=MULTIPLIER,
+        timespan=TIMESPAN,
+        window=WINDOW
+    )
+
+    for pos, (index, ticker) in enumerate(zip(df.index, df["ticker"].to_numpy())):
+        if not ticker:
             continue
 
         print(f"[{index + 1}/{len(df)}] Processing {ticker}...", end=" ")
-
-        results = utils_technical_indicators.process_technical_indicators(
-            ticker=ticker,
-            end_date=date,
-            lookback=LOOKBACK,
-            multiplier=MULTIPLIER,
-            timespan=TIMESPAN,
-            window=WINDOW
-        )
+        results = results_by_ticker.get(ticker)
 
         if results:
             for key, value in results.items():
-                df.at[index, key] = value
+                set_value(pos, key, value)
             # CHANGE 2: Removed 'is_processed' update line
             print("Done.")
         else:
             print("Failed.")
 
-        time.sleep(12)
+    df = df.assign(**updates)
 
     # CHANGE 3: Final filter for crossover values of 0, 1, or 2
     crossover_cols = [col for col in df.columns if "crossover" in col]
     if crossover_cols:
         print("\nFiltering for recent signals (0, 1, 2)...")
-        # Keep rows where ANY crossover column has a value of 0, 1, or 2
-        df = df[df[crossover_cols].isin([0, 1, 2]).any(axis=1)].copy()
+        # Keep rows where ANY crossover column has a value of 0, 1, or 2.
+        # Periods are mixed ints / 'pos' / 'neg', so compare on the raw object array.
+        arr = df[crossover_cols].to_numpy()
+        mask = ((arr == 0) | (arr == 1) | (arr == 2)).any(axis=1)
+        df = df.loc[mask].copy()
 
     # 3. Export Results
     print(f"Exporting {len(df)} filtered rows...")
@@ -1,3 +1,4 @@
+import atexit
 import smtplib
 import os
 from email.mime.multipart import MIMEMultipart
@@ -11,28 +12,89 @@ from pathlib import Path
 current_dir = Path(__file__).resolve().parent
 project_root = current_dir.parent
 
+# --- SMTP CONNECTION ---
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 465
+_SMTP = {"server": None, "user": None}
+
+
+def get_smtp_server(sender_email, app_password):
+    """
+    Returns a logged-in SMTP_SSL connection, reusing the one from the previous
+    send while it is still alive so batched reports don't reconnect per email.
+    """
+    server = _SMTP["server"]
+    if server is not None and _SMTP["user"] == sender_email:
+        try:
+            if server.noop()[0] == 250:
+                return server
+        except (smtplib.SMTPException, OSError):
+            pass
+    close_smtp_server()
+
+    server = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT)
+    server.login(sender_email, app_password)
+    _SMTP.update(server=server, user=sender_email)
+    return server
+
+
+def close_smtp_server():
+    """Closes the cached SMTP connection, if any."""
+    server = _SMTP["server"]
+    _SMTP.update(server=None, user=None)
+    if server is not None:
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+
+
+atexit.register(close_smtp_server)
+
+
+# Only successful lookups are kept, so a secret that appears later is still picked up
+_APP_PASSWORDS = {}
+_RECEIVER_EMAILS = {}
+
+
 def get_app_password(filename="app_password.txt"):
-    """Retrieves Email App Password from Env Var or local file."""
+    """Retrieves Email App Password from Env Var or local file (read once per process)."""
+    if filename in _APP_PASSWORDS:
+        return _APP_PASSWORDS[filename]
+
     app_password = os.getenv('EMAIL_APP_PASSWORD_GITHUB')
-    if app_password:
-        return app_password
+    if not app_password:
+        key_path = project_root / "creds" / filename
+        try:
+            if key_path.exists():
+                with open(key_path, "r") as f:
+                    app_password = f.read().strip()
+        except Exception:
+            pass
 
-    key_path = project_root / "creds" / filename
-    try:
-        if key_path.exists():
-            with open(key_path, "r") as f:
-                return f.read().strip()
-    except Exception:
-        pass
-    return None
+    if not app_password:
+        return None
+    _APP_PASSWORDS[filename] = app_password
+    return app_password
 
 def get_receiver_emails(filename="email_list.txt"):
     """
-    Retrieves recipients. Handles formats like:
+    Retrieves recipients (read once per process). Handles formats like:
     - email1@abc.com, email2@abc.com
     - email1@abc.com\nemail2@abc.com
     - email1@abc.com, \n email2@abc.com
     """
+    emails = _RECEIVER_EMAILS.get(filename)
+    if emails is None:
+        emails = _load_receiver_emails(filename)
+        # Like the app password, an empty result isn't kept so a list that appears later is used
+        if emails:
+            _RECEIVER_EMAILS[filename] = emails
+    # Fresh list each call so callers can't mutate the cached copy
+    return list(emails)
+
+
+def _load_receiver_emails(filename):
     raw_data = ""
 
     # 1. Try GitHub Secret
@@ -52,7 +114,7 @@ def get_receiver_emails(filename="email_list.txt"):
                 print(f"Error reading email list: {e}")
 
     if not raw_data:
-        return []
+        return ()
 
     # CLEANING LOGIC: 
     # Replace all newlines with commas, then split by comma
@@ -60,7 +122,7 @@ def get_receiver_emails(filename="email_list.txt"):
     # Split by comma and strip any surrounding whitespace from each email
     email_list = [email.strip() for email in cleaned_data.split(',') if email.strip()]
     
-    return email_list
+    return tuple(email_list)
 
 def send_report_email(receiver_list, file_path, subject=None, body=None, sender_email="your_email@gmail.com"):
     """
@@ -108,12 +170,13 @@ def send_report_email(receiver_list, file_path, subject=None, body=None, sender_
         part.add_header("Content-Disposition", f"attachment; filename= {filename}")
         msg.attach(part)
         
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(sender_email, app_password)
-            # send_message correctly routes to the BCC list
-            server.send_message(msg)
+        server = get_smtp_server(sender_email, app_password)
+        # send_message correctly routes to the BCC list
+        server.send_message(msg)
         print(f"Success! Email sent to {len(receiver_list)} recipients via BCC.")
         return True
     except Exception as e:
         print(f"Failed to send email: {e}")
+        # Don't reuse a connection that may be in a bad state
+        close_smtp_server()
         return False
\ No newline at end of file
@@ -1,10 +1,20 @@
 # gsheet_handler.py
 import os
 import json
+import time
+from functools import lru_cache
+
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 import pandas as pd
-from gspread.utils import ValueInputOption
+from gspread.utils import ValueInputOption, absolute_range_name, numericise_all
+
+
+# Authorized clients, keyed by where the credentials came from
+_CLIENTS = {}
+
+EXPORT_CHUNK_ROWS = 5000  # rows per write request, keeps payloads under request-size caps
+MAX_QUOTA_RETRIES = 5     # retries on HTTP 429 before giving up
 
 
 # ==========================================
@@ -15,7 +25,13 @@ def authenticate_gsheet(creds_file_path):
     """
     Authenticates with Google Sheets API. 
     Checks for a GitHub Secret first, then falls back to the local JSON file.
+    The authorized client is reused for later calls with the same credentials.
     """
+    google_json_str = os.getenv('SERVICE_ACCOUNT_KEY_GITHUB')
+    cache_key = ('env', google_json_str) if google_json_str else ('file', str(creds_file_path))
+    if cache_key in _CLIENTS:
+        return _CLIENTS[cache_key]
+
     scope = [
         "https://www.googleapis.com/auth/spreadsheets",
         "https://www.googleapis.com/auth/drive"
@@ -23,8 +39,6 @@ def authenticate_gsheet(creds_file_path):
     
     try:
         # 1. Check if we are running on GitHub (looking for the Secret)
-        google_json_str = os.getenv('SERVICE_ACCOUNT_KEY_GITHUB')
-
         if google_json_str:
             print("Environment variable found. Authenticating via GitHub Secret...")
             creds_info = json.loads(google_json_str)
@@ -36,31 +50,85 @@ def authenticate_gsheet(creds_file_path):
 
         client = gspread.authorize(creds)
         print("GSheet authentication successful.")
+        _CLIENTS[cache_key] = client
         return client
     except Exception as e:
         print(f"Error during GSheet authentication: {e}")
         return None
 
 
-def extract_data(client, spreadsheet_id, input_tab_name):
+def call_with_backoff(func, *args, **kwargs):
+    """
+    Calls a gspread API method, retrying on 429 (quota exceeded) errors.
+    Waits for the response's Retry-After if given, otherwise 1, 2, 4, ... seconds.
+    """
+    for attempt in range(MAX_QUOTA_RETRIES + 1):
+        try:
+            return func(*args, **kwargs)
+        except gspread.exceptions.APIError as e:
+            resp = getattr(e, 'response', None)
+            if resp is None or resp.status_code != 429 or attempt == MAX_QUOTA_RETRIES:
+                raise
+            try:
+                delay = float(resp.headers.get('Retry-After', 2 ** attempt))
+            except ValueError:
+                delay = 2 ** attempt
+            print(f"GSheet quota exceeded, retrying in {delay:.0f}s...")
+            time.sleep(delay)
+
+
+def is_missing_tab_error(error):
+    """
+    True if a gspread APIError is the 400 the Sheets API returns for a range on a tab
+    that does not exist.
+    """
+    resp = getattr(error, 'response', None)
+    return (resp is not None and resp.status_code == 400
+            and 'Unable to parse range' in str(error))
+
+
+@lru_cache(maxsize=8)
+def open_spreadsheet(client, spreadsheet_id):
+    """
+    Returns the Spreadsheet handle for 'spreadsheet_id', opening it (one Drive API
+    round trip) only the first time it is requested with this client.
+    """
+    return client.open_by_key(spreadsheet_id)
+
+
+def extract_data(client, spreadsheet_id, input_tab_name, numeric_cols=None):
     """
     Reads all records from the specified GSheet tab into a Pandas DataFrame.
 
+    Blank cells come back as "" and force object dtype, so any columns listed in
+    'numeric_cols' are coerced to numbers (blank/non-numeric -> NaN) to keep
+    filters on them vectorized.
+
     Returns:
     - pandas.DataFrame: DataFrame containing the input data, or an empty DataFrame/None on failure.
     """
     try:
-        sheet = client.open_by_key(spreadsheet_id)
+        sheet = open_spreadsheet(client, spreadsheet_id)
         worksheet = sheet.worksheet(input_tab_name)
 
         print(f"Reading data from tab: '{input_tab_name}'...")
-        data = worksheet.get_all_records()
-        df = pd.DataFrame(data)
+        # Raw 2D values straight into the frame, skipping get_all_records' per-row dicts.
+        # Cells are still numericised the same way get_all_records does it.
+        rows = worksheet.get_all_values()
+        if not rows:
+            print("Input tab is empty.")
+            return None
+        header, *body = rows
+        df = pd.DataFrame([numericise_all(row) for row in body], columns=header)
 
         if df.empty:
             print("Input tab is empty.")
             return None
 
+        for col in numeric_cols or []:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+
         return df
     except Exception as e:
         print(f"Error extracting data from GSheet: {e}")
@@ -77,33 +145,46 @@ def export_data(client, spreadsheet_id, output_tab_name, df):
         return
 
     try:
-        sheet = client.open_by_key(spreadsheet_id)
-
-        # 1. Get or create the worksheet
-        try:
-            out_worksheet = sheet.worksheet(output_tab_name)
-        except gspread.exceptions.WorksheetNotFound:
-            print(f"Tab '{output_tab_name}' not found. Creating it...")
-            out_worksheet = sheet.add_worksheet(title=output_tab_name, rows=100, cols=len(df.columns) + 5)
-
-        # 2. Prepare data: Replace NaNs with empty string
-        # --- ADD THIS LINE TO CONVERT TIMESTAMPS TO STRINGS ---
-        for col in df.columns:
-            if pd.api.types.is_datetime64_any_dtype(df[col]):
-                df[col] = df[col].astype(str)
-        # -----------------------------------------------------
-
-        df_clean = df.fillna('')
-
-        # 3. Append only the data rows (remove .columns.values.tolist() call)
-        # Using append_rows with 'ValueInputOption.user_entered' ensures
-        # numbers and dates are formatted correctly in GSheet
-        out_worksheet.append_rows(
-            values=df_clean.values.tolist(),
-            value_input_option=ValueInputOption.user_entered
-        )
+        sheet = open_spreadsheet(client, spreadsheet_id)
+
+        # 1. Prepare data: convert timestamps to strings, replace NaNs with empty string
+        # (assign() builds a new frame, so the caller's DataFrame is left untouched)
+        datetime_cols = df.select_dtypes(include=['datetime', 'datetimetz']).columns
+        if len(datetime_cols):
+            df = df.assign(**{col: df[col].astype(str) for col in datetime_cols})
+
+        # Convert column by column (each keeps its own dtype) and zip into rows, rather than
+        # going through one mixed-type 2D object array via .values
+        df = df.fillna('')
+        columns = [df.iloc[:, i].tolist() for i in range(df.shape[1])]
+        rows = [list(row) for row in zip(*columns)]
+
+        # 2. Append only the data rows (no headers), one values.append request per chunk of
+        # EXPORT_CHUNK_ROWS, addressed by tab name so no worksheet lookup is needed.
+        # 'USER_ENTERED' ensures numbers and dates are formatted correctly in GSheet
+        for start in range(0, len(rows), EXPORT_CHUNK_ROWS):
+            chunk = rows[start:start + EXPORT_CHUNK_ROWS]
+            try:
+                call_with_backoff(
+                    sheet.values_append,
+                    absolute_range_name(output_tab_name),
+                    params={'valueInputOption': ValueInputOption.user_entered},
+                    body={'values': chunk}
+                )
+            except gspread.exceptions.APIError as e:
+                # Only a missing tab is recoverable, and only the first chunk can hit that
+                if start or not is_missing_tab_error(e):
+                    raise
+                # A new tab is empty, so there is no table to detect: size it to fit and
+                # write the chunk from A1 in one values.batchUpdate request
+                print(f"Tab '{output_tab_name}' not found. Creating it...")
+                sheet.add_worksheet(title=output_tab_name, rows=len(rows), cols=len(df.columns) + 5)
+                call_with_backoff(sheet.values_batch_update, body={
+                    'valueInputOption': ValueInputOption.user_entered,
+                    'data': [{'range': absolute_range_name(output_tab_name, 'A1'), 'values': chunk}]
+                })
 
         print(f"Success! Data appended to tab: '{output_tab_name}'")
 
     except Exception as e:
-        print(f"Error appending data to GSheet: {e}")
\ No newline at end of file
+        print(f"Error appending data to GSheet: {e}")
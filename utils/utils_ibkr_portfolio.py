@@ -5,6 +5,10 @@ Reusable functions for connecting to IBKR and fetching portfolio data.
 Refactored from mda_picks/fetch_ibkr_portfolio.py to be importable.
 """
 
+import math
+import time
+from contextlib import contextmanager
+
 from ib_insync import IB
 
 
@@ -88,6 +92,74 @@ def disconnect_ibkr(ib):
         print("Disconnected from IBKR")
 
 
+@contextmanager
+def ibkr_session(host='127.0.0.1', port=7496, client_id=9, timeout=5):
+    """
+    Context manager around connect_ibkr()/disconnect_ibkr().
+
+    Lets scripts connect once and hand the same IB instance to every
+    function that needs it:
+
+        with ibkr_session(HOST, PORT, CLIENT_ID) as ib:
+            ...
+
+    Raises:
+        ConnectionError: If connection fails
+    """
+    ib = connect_ibkr(host, port, client_id, timeout)
+    try:
+        yield ib
+    finally:
+        disconnect_ibkr(ib)
+
+
+def pick_price(ticker):
+    """
+    Returns the first usable price of a snapshot ticker.
+
+    Args:
+        ticker: ib_insync Ticker from reqMktData
+
+    Returns:
+        float: first of last, close, marketPrice() that is finite and positive, else None
+    """
+    for p in (ticker.last, ticker.close, ticker.marketPrice()):
+        if p is not None and math.isfinite(p) and p > 0:
+            return p
+    return None
+
+
+def has_price(ticker):
+    """True once a snapshot ticker carries a usable price."""
+    return pick_price(ticker) is not None
+
+
+def wait_for_prices(ib, tickers, timeout):
+    """Pump ib_insync updates until every ticker has a price or timeout seconds pass."""
+    deadline = time.time() + timeout
+    while time.time() < deadline and not all(has_price(t) for t in tickers):
+        ib.waitOnUpdate(timeout=0.2)
+
+
+def request_snapshots(ib, contracts, wait=2):
+    """
+    Qualify all contracts in one batch, fire a snapshot request for each and wait
+    once for them to populate.
+
+    Args:
+        ib: Connected IB instance
+        contracts: ib_insync Contracts (conIds are filled in place)
+        wait: Maximum seconds to wait for prices
+
+    Returns:
+        list of Tickers, in the same order as contracts
+    """
+    ib.qualifyContracts(*contracts)
+    tickers = [ib.reqMktData(c, '', True, False) for c in contracts]
+    wait_for_prices(ib, tickers, wait)
+    return tickers
+
+
 # Allow standalone execution for quick portfolio check
 if __name__ == "__main__":
     HOST = '127.0.0.1'
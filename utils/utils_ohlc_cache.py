@@ -0,0 +1,77 @@
+# utils/utils_ohlc_cache.py
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+CACHE_DIR = Path(__file__).resolve().parent.parent / '.cache' / 'ohlc'
+CACHE_TTL = 24 * 60 * 60  # seconds; only applies to entries written before their range closed
+MARKET_TZ = 'America/New_York'
+SESSION_CLOSE = pd.Timedelta(hours=16)
+
+
+# ==========================================
+# CACHE HELPERS
+# ==========================================
+
+def cache_path(ticker, end_date, lookback_days, multiplier, timespan):
+    """
+    Returns the pickle path for one get_ohlc_data() request.
+    """
+    key = f"{ticker}|{end_date}|{lookback_days}|{multiplier}|{timespan}"
+    digest = hashlib.md5(key.encode()).hexdigest()
+    return CACHE_DIR / str(ticker) / f"{digest}.pkl"
+
+
+def session_close(end_date):
+    """
+    Returns the (tz-aware) market close of the session on 'end_date'.
+    """
+    ts = pd.Timestamp(end_date)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert(MARKET_TZ).tz_localize(None)
+    return (ts.normalize() + SESSION_CLOSE).tz_localize(MARKET_TZ)
+
+
+def load_ohlc(ticker, end_date, lookback_days, multiplier, timespan):
+    """
+    Returns the cached OHLC DataFrame, or None on a miss.
+    An entry written after the range's last session closed holds every bar and never
+    expires; one written while the range was still open is subject to CACHE_TTL.
+    """
+    path = cache_path(ticker, end_date, lookback_days, multiplier, timespan)
+    if not path.exists():
+        return None
+
+    written = path.stat().st_mtime
+    is_complete = pd.Timestamp(written, unit='s', tz='UTC') > session_close(end_date)
+    if not is_complete and time.time() - written > CACHE_TTL:
+        return None
+
+    try:
+        return pd.read_pickle(path)
+    except Exception as e:
+        print(f"  -> Ignoring unreadable cache entry for {ticker}: {e}")
+        return None
+
+
+def save_ohlc(df, ticker, end_date, lookback_days, multiplier, timespan):
+    """
+    Writes the OHLC DataFrame to the cache. Failures are reported, never raised.
+    """
+    path = cache_path(ticker, end_date, lookback_days, multiplier, timespan)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so concurrent readers never see a partial file
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"  -> Could not cache OHLC data for {ticker}: {e}")
@@ -1,11 +1,17 @@
 # utils/utils_polygon_connection.py
 import os
+import threading
+import time
+from collections import deque
+from functools import lru_cache
 
+@lru_cache(maxsize=1)
 def get_api_key(filename="polygon_api_key.txt"):
     """
     Retrieves the Polygon API key.
     Checks for a GitHub Secret (environment variable) first.
     Falls back to loading from a text file inside the 'creds' folder.
+    Resolved on first use and cached; call get_api_key.cache_clear() to re-read.
     """
     # 1. First, try to get the key from the GitHub Secret / Environment Variable
     api_key = os.getenv('POLYGON_API_KEY_GITHUB')
@@ -35,5 +41,47 @@ def get_api_key(filename="polygon_api_key.txt"):
         
     return ""
 
-# Initialize the global API_KEY for other files to import
-API_KEY = get_api_key()
\ No newline at end of file
+def __getattr__(name):
+    # Keep 'from utils_polygon_connection import API_KEY' working without reading the key at import time
+    if name == "API_KEY":
+        return get_api_key()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class RateLimiter:
+    """
+    Thread-safe sliding-window limiter: at most `calls` acquisitions in any
+    `period` seconds. acquire() blocks only as long as needed to stay under it,
+    and defer() holds every caller back when the server asks us to slow down.
+    """
+
+    def __init__(self, calls, period):
+        self.calls = calls
+        self.period = period
+        self._stamps = deque()
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def defer(self, seconds):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._stamps and now - self._stamps[0] >= self.period:
+                    self._stamps.popleft()
+                if now < self._resume_at:
+                    wait = self._resume_at - now
+                elif len(self._stamps) < self.calls:
+                    self._stamps.append(now)
+                    return
+                else:
+                    wait = self.period - (now - self._stamps[0])
+            time.sleep(wait)
+
+
+# Polygon free tier is 5 requests per minute; set POLYGON_CALLS_PER_MINUTE on paid tiers.
+# Shared by every caller in the process.
+POLYGON_LIMITER = RateLimiter(calls=int(os.getenv('POLYGON_CALLS_PER_MINUTE', '5')), period=60)
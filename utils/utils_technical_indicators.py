@@ -1,18 +1,96 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import talib
-# Import the API_KEY from your new connection utility
-from .utils_polygon_connection import API_KEY
+try:
+    import orjson  # faster decode of large aggregate responses
+except ImportError:
+    orjson = None
+# The API key is resolved lazily from the connection utility on the first real fetch
+from .utils_polygon_connection import get_api_key, POLYGON_LIMITER
+from . import utils_ohlc_cache
+
+
+logger = logging.getLogger(__name__)
+
+MAX_RATE_LIMIT_RETRIES = 3
+# Numeric fields kept from each Polygon aggregate bar (besides the 't' timestamp)
+OHLC_FIELDS = ("o", "h", "l", "c", "v", "vw", "n")
+# Intraday session window, as milliseconds since midnight
+MS_PER_DAY = 24 * 60 * 60 * 1000
+SESSION_OPEN_MS = (9 * 60 + 30) * 60 * 1000
+SESSION_CLOSE_MS = 16 * 60 * 60 * 1000
+REQUEST_TIMEOUT = (3.05, 30)  # (connect, read) seconds
+
+# One pooled session for every Polygon call, so worker threads reuse TCP/TLS connections.
+# Transient 5xx/connection errors are retried here; 429s are left to the shared rate
+# limiter below, which pauses every thread rather than just the one that was throttled.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
+))
 
 
+# ==========================================
+# NUMERIC KERNELS
+# ==========================================
+
+def _donchian(values, n, reducer):
+    """
+    Rolling max/min of the previous n bars (offset=1) on a plain array.
+    Matches Series.rolling(n).max().shift(1): the first n entries are NaN.
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.full(len(values), np.nan)
+    if len(values) > n:
+        windows = np.lib.stride_tricks.sliding_window_view(values[:-1], n)
+        out[n:] = reducer(windows, axis=1)
+    return out
+
 
 # ==========================================
 # CORE FUNCTIONS
 # ==========================================
 
-def get_ohlc_data(ticker, end_date, lookback_days, multiplier, timespan, api_key=API_KEY):
+def retry_after_seconds(resp, default):
+    """
+    Seconds to wait according to a 429 response's Retry-After header.
+    """
+    try:
+        return max(float(resp.headers.get("Retry-After", default)), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+def polygon_get(url, params, ticker):
+    """
+    GETs one Polygon page through the shared session and rate limiter, backing off on 429s.
+    Raises requests.exceptions.RequestException on failure.
+    """
+    for _ in range(MAX_RATE_LIMIT_RETRIES + 1):
+        POLYGON_LIMITER.acquire()
+        resp = _SESSION.get(url, params=params, timeout=REQUEST_TIMEOUT)
+        if resp.status_code != 429:
+            break
+        # Pause every caller for as long as Polygon asks (or one full window if it doesn't say)
+        delay = retry_after_seconds(resp, default=POLYGON_LIMITER.period)
+        print(f"  -> Rate limited on {ticker}, backing off {delay:.0f}s...")
+        POLYGON_LIMITER.defer(delay)
+    resp.raise_for_status()
+    if orjson is not None:
+        return orjson.loads(resp.content)
+    return resp.json()
+
+
+def get_ohlc_data(ticker, end_date, lookback_days, multiplier, timespan, api_key=None):
     """
     Fetches OHLC data from Polygon.io ending at 'end_date' with flexible aggregation.
 
@@ -22,11 +100,21 @@ def get_ohlc_data(ticker, end_date, lookback_days, multiplier, timespan, api_key
     - lookback_days (int): The number of calendar days of history to fetch.
     - multiplier (int): The number of timespans to aggregate (e.g., 1, 5, 10).
     - timespan (str): The unit of time (e.g., 'minute', 'hour', 'day', 'week', 'month', 'quarter', 'year').
+    - api_key (str, optional): Polygon API key. Defaults to get_api_key().
 
     Returns:
     - pandas.DataFrame: OHLC data, or None on failure.
     """
 
+    # Cache hits skip both the HTTP call and the rate limiter
+    cached = utils_ohlc_cache.load_ohlc(ticker, end_date, lookback_days, multiplier, timespan)
+    if cached is not None:
+        print(f"  -> Using cached {multiplier} {timespan} data...")
+        return cached
+
+    if api_key is None:
+        api_key = get_api_key()
+
     end_dt = pd.to_datetime(end_date)
     # Calculate start date based on the lookback days (calendar days)
     start_dt = end_dt - pd.Timedelta(days=lookback_days)
@@ -43,26 +131,38 @@ def get_ohlc_data(ticker, end_date, lookback_days, multiplier, timespan, api_key
     print(f"  -> Fetching {multiplier} {timespan} data...")
 
     try:
-        resp = requests.get(url, params=params)
-        resp.raise_for_status()
-        data = resp.json()
+        data = polygon_get(url, params, ticker)
+        if "results" not in data:
+            print(f"  -> No results found for {ticker} in range.")
+            return None
+
+        # Long intraday ranges are split into pages; follow next_url until the last one
+        results = list(data["results"])
+        while data.get("next_url"):
+            data = polygon_get(data["next_url"], {"apiKey": api_key}, ticker)
+            results.extend(data.get("results", []))
     except requests.exceptions.RequestException as e:
         print(f"Request failed for {ticker}: {e}")
         return None
 
-    if "results" not in data:
-        print(f"  -> No results found for {ticker} in range.")
-        return None
+    # Build the frame from one typed array per field rather than from a list of per-bar dicts.
+    # Prices/volumes are float64 from the start, even when Polygon sends whole numbers as ints.
+    count = len(results)
+    columns = {"t": np.fromiter((r["t"] for r in results), dtype=np.int64, count=count)}
+    for key in OHLC_FIELDS:
+        columns[key] = np.fromiter((r.get(key, np.nan) for r in results), dtype=np.float64, count=count)
+    # Apply market hours filter to ALL data (09:30-16:00 inclusive, on the same clock
+    # between_time used), straight on the epoch milliseconds before any datetime conversion
+    if timespan in ["minute", "hour"]:
+        ms_of_day = columns["t"] % MS_PER_DAY
+        keep = (ms_of_day >= SESSION_OPEN_MS) & (ms_of_day <= SESSION_CLOSE_MS)
+        columns = {key: values[keep] for key, values in columns.items()}
 
-    df = pd.DataFrame(data["results"])
+    df = pd.DataFrame(columns)
 
     # 't' is the timestamp. Convert to date for daily/weekly or datetime for minute/hour data.
     df["t"] = pd.to_datetime(df["t"], unit="ms")
 
-    # Apply market hours filter to ALL data
-    if timespan in ["minute", "hour"]:
-        df = df.set_index("t").between_time("09:30", "16:00").reset_index()
-
     # If the aggregation is 'day' or larger, we usually only care about the date part.
     if timespan in ["day", "week", "month", "quarter", "year"]:
         df["t"] = df["t"].dt.date
@@ -70,7 +170,9 @@ def get_ohlc_data(ticker, end_date, lookback_days, multiplier, timespan, api_key
     df = df.rename(columns={"c": "close", "o": "open", "h": "high", "l": "low", "v": "volume"})
 
     # Ensure data is sorted by time/date
-    return df.sort_values("t").reset_index(drop=True)
+    df = df.sort_values("t").reset_index(drop=True)
+    utils_ohlc_cache.save_ohlc(df, ticker, end_date, lookback_days, multiplier, timespan)
+    return df
 
 
 def get_technical_indicators(df):
@@ -81,31 +183,31 @@ def get_technical_indicators(df):
     if df is None or df.empty:
         return None
 
-    # Arrays for TA-Lib
-    high = df["high"].values
-    low = df["low"].values
-    close = df["close"].values
+    # Arrays for TA-Lib (float64 without a copy when the column already is)
+    high = df["high"].to_numpy(dtype=float)
+    low = df["low"].to_numpy(dtype=float)
+    close = df["close"].to_numpy(dtype=float)
+
+    # Build every indicator as a plain array, then add them to the frame in one assign()
+    arrs = {}
 
     # 1. EMAs
-    df["EMA30"] = talib.EMA(close, timeperiod=30)
-    df["EMA150"] = talib.EMA(close, timeperiod=150)
+    arrs["EMA30"] = talib.EMA(close, timeperiod=30)
+    arrs["EMA150"] = talib.EMA(close, timeperiod=150)
 
     # 2. ADX / DI
-    df["PLUS_DI"] = talib.PLUS_DI(high, low, close, timeperiod=14)
-    df["MINUS_DI"] = talib.MINUS_DI(high, low, close, timeperiod=14)
-    df["DI_diff"] = df["PLUS_DI"] - df["MINUS_DI"]
+    arrs["PLUS_DI"] = talib.PLUS_DI(high, low, close, timeperiod=14)
+    arrs["MINUS_DI"] = talib.MINUS_DI(high, low, close, timeperiod=14)
 
     # 3. Donchian Channels Calculation (Last N candles, offset=1)
     for n in [5, 10, 20]:
-        df[f"donchian_high{n}"] = df["high"].rolling(window=n).max().shift(1)
-        df[f"donchian_low{n}"] = df["low"].rolling(window=n).min().shift(1)
+        arrs[f"donchian_high{n}"] = _donchian(high, n, np.max)
+        arrs[f"donchian_low{n}"] = _donchian(low, n, np.min)
 
     # 4. RSI (14)
-    df["RSI"] = talib.RSI(close, timeperiod=14)
+    arrs["RSI"] = talib.RSI(close, timeperiod=14)
 
-    
-    
-    return df
+    return df.assign(**arrs)
 
 
 def calculate_crossovers(df):
@@ -127,7 +229,7 @@ def calculate_crossovers(df):
     df["ema30_ema150_crossover"] = df["EMA30"] - df["EMA150"]
 
     # +DI > -DI
-    df["adx_crossover"] = df["DI_diff"]
+    df["adx_crossover"] = df["PLUS_DI"] - df["MINUS_DI"]
 
     # Donchian Crossovers
     for n in [5, 10, 20]:
@@ -149,59 +251,50 @@ def calculate_crossover_periods(df, window_size=10):
     2. Ranks rows: 0 is the latest timestamp.
     3. Identifies 'pos', 'neg', or the rank of the most recent positive crossover.
     """
-    # Create a copy to avoid SettingWithCopy warnings
-    temp_df = df.copy().sort_values("t", ascending=False).reset_index(drop=True)
+    # Identify all crossover columns
+    crossover_cols = [col for col in df.columns if "crossover" in col]
 
-    # 1. Select the last X bars (window_size)
+    # 1. Select the last X bars (window_size), newest first, as a slice rather than copies.
     # Even if period_type is minutes, this selects the last X periods
-    analysis_df = temp_df.head(window_size).copy()
-
-    # 2. Rank the rows: 0 being the latest timestamp
-    analysis_df["rank"] = range(len(analysis_df))
+    if not df["t"].is_monotonic_increasing:
+        df = df.sort_values("t")
+    window = df[crossover_cols].iloc[-window_size:][::-1] if window_size > 0 else df[crossover_cols].iloc[:0]
 
-    # ADDED DEBUG PRINT
-    print(f"\n--- Debug: Starting Crossover Calculation ---")
-    # Filter columns that contain 'crossover' or are exactly 'rank'
-    debug_cols = [col for col in analysis_df.columns if "crossover" in col or col == "rank"]
-    # Print only those columns
-    print(f"DataFrame received (Filtered):\n{analysis_df[debug_cols].to_string(index=False)}")
-    # ---------------------------
+    # Rendering the window is costly, so it only happens when DEBUG logging is enabled
+    if logger.isEnabledFor(logging.DEBUG):
+        # Crossover columns plus the rank (0 being the latest timestamp)
+        debug_df = window.assign(rank=range(len(window)))
+        logger.debug("Crossover window (rank 0 = latest):\n%s", debug_df.to_string(index=False))
 
     results = {}
 
-    # Identify all crossover columns
-    crossover_cols = [col for col in analysis_df.columns if "crossover" in col]
+    # One (window, k) array instead of a Series per column; row 0 is the latest bar.
+    # pos/neg are computed separately so NaNs count as neither, as with the Series compares.
+    arr = window.to_numpy(dtype=float)
+    pos = arr >= 0
+    neg = arr < 0
+
+    # A 'flip' is where current is positive AND previous (rank i+1, older data) was negative
+    flips = pos[:-1] & neg[1:]
 
-    for col in crossover_cols:
+    for j, col in enumerate(crossover_cols):
         new_col_name = f"{col}_period"
-        series = analysis_df[col]
 
         # 1. If all values are positive or zero, then col = 'pos'
-        if (series >= 0).all():
+        if pos[:, j].all():
             results[new_col_name] = 'pos'
 
         # 2. If all values are negative, then col = 'neg'
-        elif (series < 0).all():
+        elif neg[:, j].all():
             results[new_col_name] = 'neg'
 
-        # 3. Otherwise, find the lowest rank of a positive value
-        # that follows a negative value from the previous higher rank (older data)
+        # 3. Otherwise, the lowest rank (most recent) flip wins
+        elif flips[:, j].any():
+            results[new_col_name] = int(flips[:, j].argmax())
+
+        # Fallback: if there are negatives but no - to + transition (e.g., currently negative)
         else:
-            # We shift the series to compare each value with the one at the 'previous higher rank'
-            # analysis_df is sorted by rank 0, 1, 2... (0 is newest, 9 is oldest)
-            # series.shift(-1) brings the older data (rank i+1) up to compare with rank i
-            is_positive = series >= 0
-            was_negative = series.shift(-1) < 0
-
-            # A 'flip' is where current is positive AND previous was negative
-            flips = analysis_df[is_positive & was_negative]
-
-            if not flips.empty:
-                # The first row in 'flips' is the one with the lowest rank (most recent)
-                results[new_col_name] = int(flips["rank"].iloc[0])
-            else:
-                # Fallback: if there are negatives but no - to + transition (e.g., currently negative)
-                results[new_col_name] = 'neg'
+            results[new_col_name] = 'neg'
 
     return results
 
@@ -253,4 +346,21 @@ def process_technical_indicators(ticker, end_date, lookback=365, multiplier=1, t
     # This returns a dictionary of all xxxxx_crossover_period results
     scoring_results = calculate_crossover_periods(df_filtered, window_size=window)
 
-    return scoring_results
\ No newline at end of file
+    return scoring_results
+
+
+def process_many(tickers, max_workers=16, **kwargs):
+    """
+    Runs process_technical_indicators for several tickers concurrently.
+
+    The work is mostly waiting on Polygon, so threads overlap the HTTP calls while the
+    shared rate limiter keeps the process under the API quota. Duplicate tickers are
+    fetched once. 'kwargs' are passed through (end_date, lookback, multiplier, ...).
+
+    Returns:
+    - dict: ticker -> scoring results dict, or None if that ticker failed.
+    """
+    unique_tickers = list(dict.fromkeys(tickers))
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        results = ex.map(lambda t: process_technical_indicators(t, **kwargs), unique_tickers)
+        return dict(zip(unique_tickers, results))
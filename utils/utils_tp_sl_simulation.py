@@ -1,5 +1,6 @@
 # utils/utils_tp_sl_simulation.py
 import time
+import numpy as np
 import pandas as pd
 from .utils_technical_indicators import get_ohlc_data
 
@@ -23,10 +24,9 @@ def run_simulation(ticker, pick_date, calendar_days, tp_sl_list, trading_days_li
     if df_ohlc is None or df_ohlc.empty:
         return {"error": "No OHLC data returned from Polygon"}
 
-    # Exclude the 'Date' specified in the input
-    df_ohlc['date_only'] = pd.to_datetime(df_ohlc['t']).dt.date
-    df_ohlc = df_ohlc[df_ohlc['date_only'] > pick_dt.date()].copy()
-    df_ohlc = df_ohlc.sort_values('t').reset_index(drop=True)
+    # Exclude the 'Date' specified in the input (days kept as datetime64[D], not Python dates)
+    df_ohlc['date_only'] = pd.to_datetime(df_ohlc['t']).to_numpy().astype('datetime64[D]')
+    df_ohlc = df_ohlc[df_ohlc['date_only'] > np.datetime64(pick_dt.date(), 'D')].sort_values('t').reset_index(drop=True)
 
     if df_ohlc.empty:
         return {"error": "No data available after the pick date"}
@@ -34,55 +34,63 @@ def run_simulation(ticker, pick_date, calendar_days, tp_sl_list, trading_days_li
     # --- PART 3: Simulate TP, SL & Trailing Stop ---
     try:
         # 1. Identify valid trading days
-        unique_days = sorted(df_ohlc['date_only'].unique())
-        target_days = unique_days[:trading_days_limit]
-        df = df_ohlc[df_ohlc['date_only'].isin(target_days)].copy()
+        target_days = np.unique(df_ohlc['date_only'].to_numpy())[:trading_days_limit]
+        df = df_ohlc[df_ohlc['date_only'].isin(target_days)]
 
         # 2. Exclude first 10 mins (9:30-9:39) of the first trading day
         first_day = target_days[0]
-        mask_mkt_open = (df['date_only'] == first_day) & (
-                    pd.to_datetime(df['t']).dt.time < pd.to_datetime("09:40:00").time())
-        df = df[~mask_mkt_open].copy()
+        day_values = df['date_only'].to_numpy()
+        time_of_day = pd.to_datetime(df['t']).to_numpy() - day_values
+        mask_mkt_open = (day_values == first_day) & (time_of_day < np.timedelta64(9 * 60 + 40, 'm'))
+        df = df[~mask_mkt_open]
 
         if df.empty:
             return {"error": "Insufficient data after morning exclusion"}
 
-        # 3. Create Sequences
-        df['trading_timestamp_sequence'] = range(len(df))
-        df['trading_day_sequence'] = df['date_only'].map({d: i for i, d in enumerate(target_days)})
-        df['trading_interval_sequence'] = df.groupby('date_only').cumcount()
+        # 3. Create Sequences (rows are sorted by 't', so each day's bars are contiguous:
+        # a bar's interval number is its position minus the position of its day's first bar)
+        positions = np.arange(len(df))
+        day_seq = np.searchsorted(target_days, df['date_only'].to_numpy())
+        interval_seq = positions - np.searchsorted(day_seq, day_seq, side='left')
+        df = df.assign(
+            trading_timestamp_sequence=positions,
+            trading_day_sequence=day_seq,
+            trading_interval_sequence=interval_seq
+        )
 
         # 4. Define Buy Price (9:40 AM open of the first day)
         buy_row = df.iloc[0]
         buy_price = buy_row['open']
         buy_timestamp = buy_row['t']
 
-        # 5. Iterative Loop for Trailing Stop and Existing TP/SL Breaches
-        maxima = 0
+        # 5. Trailing Stop and Existing TP/SL Breaches
         ts_breach_row = None
         
-        # We also need to calculate TP/SL breaches
-        df['is_tp_breached'] = 0
-        df['is_sl_breached'] = 0
-        for tp_mult, sl_mult, start_seq, end_seq in tp_sl_list:
-            mask = (df['trading_day_sequence'] >= start_seq) & (df['trading_day_sequence'] <= end_seq)
-            df.loc[mask & (df['high'] >= buy_price * tp_mult), 'is_tp_breached'] = 1
-            df.loc[mask & (df['low'] <= buy_price * sl_mult), 'is_sl_breached'] = 1
-
-        # Calculate Trailing Stop iteratively
-        for idx, row in df.iterrows():
-            # Update Maxima
-            if row['trading_timestamp_sequence'] == 0:
-                maxima = row['high']
-            else:
-                maxima = max(maxima, row['high'])
-            
-            # Check for TS Breach
-            trigger_sell_price = maxima * (1 - ts_pct)
-            if row['low'] <= trigger_sell_price:
-                ts_breach_row = row.copy()
-                ts_breach_row['ts_sell_price'] = trigger_sell_price
-                break # Stop loop once TS is breached
+        # We also need to calculate TP/SL breaches: one (tiers x bars) matrix per side,
+        # a bar is breached if any tier covering its trading day is breached
+        high = df['high'].to_numpy()
+        low = df['low'].to_numpy()
+        tps, sls, starts, ends = np.asarray(tp_sl_list, dtype=float).reshape(-1, 4).T
+        # Price thresholds once per tier, then broadcast against every bar
+        tp_thr = buy_price * tps
+        sl_thr = buy_price * sls
+        in_range = (day_seq >= starts[:, None]) & (day_seq <= ends[:, None])
+        tp_mat = in_range & (high[None, :] >= tp_thr[:, None])
+        sl_mat = in_range & (low[None, :] <= sl_thr[:, None])
+        df = df.assign(
+            is_tp_breached=tp_mat.any(axis=0).astype(np.int8),
+            is_sl_breached=sl_mat.any(axis=0).astype(np.int8)
+        )
+
+        # Calculate Trailing Stop in one pass: running high since the buy, then the first bar
+        # whose low touches maxima * (1 - ts_pct)
+        maxima = np.maximum.accumulate(high)
+        trigger_sell_prices = maxima * (1 - ts_pct)
+        breached = low <= trigger_sell_prices
+        if breached.any():
+            i = int(breached.argmax())
+            ts_breach_row = df.iloc[i].copy()
+            ts_breach_row['ts_sell_price'] = trigger_sell_prices[i]
 
         # 6. Find earliest breach of all three strategies
         tp_hits = df[df['is_tp_breached'] == 1]